@@ -2,41 +2,84 @@ import logging
 from logging.handlers import SMTPHandler, RotatingFileHandler
 import os
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_mail import Mail
 from config import Config
 from flask_bootstrap import Bootstrap
+from app.cache import ReportCache, IdentityCache
+from app.engine import TunedSQLAlchemy
+from app.sqlstats import QueryStats
+from app.startup import StartupProfile, in_cli, bytecode_cache, \
+    prewarm_templates
 
-db = SQLAlchemy()
-migrate = Migrate()
+db = TunedSQLAlchemy()
 login = LoginManager()
 login.login_view = 'auth.login'
 mail = Mail()
 bootstrap = Bootstrap()
+report_cache = ReportCache()
+user_cache = IdentityCache()
+query_stats = QueryStats()
 
 
 def create_app(config_class=Config):
+    profile = StartupProfile()
     app = Flask(__name__)
     app.config.from_object(config_class)
+    cli = in_cli()
 
-    db.init_app(app)
-    migrate.init_app(app, db)
-    login.init_app(app)
-    mail.init_app(app)
-    bootstrap.init_app(app)
+    with profile('db'):
+        db.init_app(app)
+    if cli:
+        # only the flask db commands need it and importing alembic is slow
+        with profile('migrate'):
+            from flask_migrate import Migrate
+            Migrate(app, db)
+    with profile('login'):
+        login.init_app(app)
+    with profile('bootstrap'):
+        bootstrap.init_app(app)
+    with profile('caches'):
+        report_cache.init_app(app)
+        user_cache.init_app(app)
+    with profile('sql stats'):
+        query_stats.init_app(app)
 
-    from app.errors import bp as errors_bp
-    app.register_blueprint(errors_bp)
+    # Flask-Mail is set up by the dispatcher when the first mail is sent
+    with profile('mail dispatcher'):
+        from app.email import mail_dispatcher
+        mail_dispatcher.init_app(app)
 
-    from app.auth import bp as auth_bp
-    app.register_blueprint(auth_bp, url_prefix='/auth')
+    if app.config['SESSION_STORE'] == 'database':
+        from app.sessions import DatabaseSessionInterface
+        app.session_interface = DatabaseSessionInterface(
+            app.config['SESSION_SWEEP_PROBABILITY'])
 
-    from app.main import bp as main_bp
-    app.register_blueprint(main_bp)
+    with profile('blueprints'):
+        from app.errors import bp as errors_bp
+        app.register_blueprint(errors_bp)
 
-    if not app.debug:
+        from app.auth import bp as auth_bp
+        app.register_blueprint(auth_bp, url_prefix='/auth')
+
+        from app.main import bp as main_bp
+        app.register_blueprint(main_bp)
+
+        from app.api import bp as api_bp
+        app.register_blueprint(api_bp, url_prefix='/api')
+
+    with profile('commands'):
+        from app.cli import register
+        register(app)
+
+    if app.config['JINJA_BYTECODE_CACHE_DIR']:
+        app.jinja_env.bytecode_cache = bytecode_cache(
+            app.config['JINJA_BYTECODE_CACHE_DIR'])
+    if app.config['TEMPLATE_PREWARM'] and not cli:
+        with profile('template prewarm'):
+            prewarm_templates(app)
+
+    if not app.debug and not app.testing:
         if app.config['MAIL_SERVER']:
             auth = None
             if app.config['MAIL_USERNAME'] or app.config['MAIL_PASSWORD']:
@@ -64,6 +107,10 @@ def create_app(config_class=Config):
         app.logger.setLevel(logging.INFO)
         app.logger.info('HabitTrack startup')
 
+    if app.config['STARTUP_PROFILE']:
+        app.logger.setLevel(logging.INFO)
+        profile.report(app.logger)
+
     return app
 
 from app import models
@@ -0,0 +1,35 @@
+from functools import wraps
+from flask import g, request
+from app.models import User
+from app.api.errors import error_response
+
+
+def basic_auth_required(f):
+    # username and password, only used to hand out tokens
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        auth = request.authorization
+        user = None
+        if auth and auth.username:
+            user = User.query.filter_by(username=auth.username).first()
+        if user is None or not user.check_password(auth.password or ''):
+            return error_response(401)
+        g.current_user = user
+        return f(*args, **kwargs)
+    return decorated
+
+
+def token_auth_required(f):
+    # 'Authorization: Bearer <token>' from POST /api/tokens
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        scheme, _, token = request.headers.get(
+            'Authorization', '').partition(' ')
+        user = None
+        if scheme.lower() == 'bearer' and token:
+            user = User.check_token(token)
+        if user is None:
+            return error_response(401)
+        g.current_user = user
+        return f(*args, **kwargs)
+    return decorated
@@ -0,0 +1,15 @@
+from flask import current_app, g, jsonify
+from app import report_cache
+from app.api import bp
+from app.api.auth import token_auth_required
+from app.api.errors import error_response
+
+
+@bp.route('/cache', methods=['GET'])
+@token_auth_required
+def cache_stats():
+    # hit/miss counters of this worker's report cache, they say how busy
+    # everyone is so only the ADMINS get to see them
+    if g.current_user.email not in current_app.config['ADMINS']:
+        return error_response(403)
+    return jsonify(report_cache.stats())
@@ -0,0 +1,77 @@
+from datetime import date
+from flask import jsonify, request, g
+from app import db
+from app.api import bp
+from app.api.auth import token_auth_required
+from app.api.errors import bad_request
+from app.models import Habit
+from app.storage import get_store
+
+MAX_CHECKINS = 5000  # per request
+MAX_ID = 2 ** 63 - 1  # the largest a BIGINT key can hold
+
+
+def parse_checkin(checkin):
+    # {"habit_id": 1, "date": "2018-07-26", "done": true} or the compact
+    # [1, "2018-07-26", true], done defaults to true
+    if isinstance(checkin, dict):
+        habit_id, day = checkin['habit_id'], checkin['date']
+        done = checkin.get('done', True)
+    else:
+        habit_id, day, done = (list(checkin) + [True])[:3]
+    if isinstance(habit_id, bool) or not isinstance(habit_id, int) or \
+            not 0 < habit_id <= MAX_ID:
+        raise ValueError(habit_id)
+    return habit_id, date(*map(int, day.split('-'))), bool(done)
+
+
+@bp.route('/checkins', methods=['POST'])
+@token_auth_required
+def update_checkins():
+    # applies many (habit_id, date, done) check-ins in one transaction and
+    # returns which of the habits are completed on each of the dates,
+    # {"completed": {"2018-07-26": [1, 3], ...}}
+    data = request.get_json(silent=True) or {}
+    checkins = data.get('checkins') if isinstance(data, dict) else None
+    if not isinstance(checkins, list) or not checkins:
+        return bad_request('must include a list of checkins')
+    if len(checkins) > MAX_CHECKINS:
+        return bad_request('at most {} checkins per request'.format(
+            MAX_CHECKINS))
+    done, undone = set(), set()
+    for checkin in checkins:
+        try:
+            habit_id, day, flag = parse_checkin(checkin)
+        except (AttributeError, KeyError, OverflowError, TypeError,
+                ValueError):
+            return bad_request('invalid checkin: {}'.format(checkin))
+        if flag:  # a later check-in for the same day wins
+            done.add((habit_id, day))
+            undone.discard((habit_id, day))
+        else:
+            undone.add((habit_id, day))
+            done.discard((habit_id, day))
+
+    habit_ids = {habit_id for habit_id, day in done | undone}
+    owned = {habit_id for habit_id, in db.session.query(Habit.id).filter(
+        Habit.user_id == g.current_user.id).filter(
+        Habit.id.in_(habit_ids))}
+    if habit_ids - owned:
+        return bad_request('unknown habit_id: {}'.format(
+            ', '.join(str(id) for id in sorted(habit_ids - owned))))
+
+    store = get_store()
+    store.bulk_add(done)
+    store.bulk_remove(undone)
+    store.refresh(habit_ids)
+    g.current_user.bump_data_version()
+    db.session.commit()
+
+    days = sorted({day for habit_id, day in done | undone})
+    ids = sorted(habit_ids)
+    bitmaps = store.bitmaps(ids, days[0], days[-1])
+    completed = {}
+    for day in days:
+        bit = 1 << (day - days[0]).days
+        completed[day.isoformat()] = [id for id in ids if bitmaps[id] & bit]
+    return jsonify({'completed': completed})
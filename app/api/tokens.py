@@ -0,0 +1,20 @@
+from flask import jsonify, g
+from app import db
+from app.api import bp
+from app.api.auth import basic_auth_required, token_auth_required
+
+
+@bp.route('/tokens', methods=['POST'])
+@basic_auth_required
+def get_token():
+    token = g.current_user.get_token()
+    db.session.commit()
+    return jsonify({'token': token})
+
+
+@bp.route('/tokens', methods=['DELETE'])
+@token_auth_required
+def revoke_token():
+    g.current_user.revoke_token()
+    db.session.commit()
+    return '', 204
@@ -0,0 +1,72 @@
+from datetime import date, timedelta
+
+# a year of one habit's completions is stored as an int, bit 0 being the
+# 1st of January, and serialized little-endian into YEAR_BYTES bytes
+YEAR_BYTES = 46  # 366 bits rounded up to whole bytes
+
+
+def from_bytes(data):
+    return int.from_bytes(data, 'little') if data else 0
+
+
+def to_bytes(bits):
+    return bits.to_bytes(YEAR_BYTES, 'little')
+
+
+def day_bit(day):
+    return day.timetuple().tm_yday - 1
+
+
+def days_of(year, bits):
+    # the dates of the set bits of a year, in order
+    first = date(year, 1, 1)
+    while bits:
+        low = bits & -bits
+        bits ^= low
+        yield first + timedelta(low.bit_length() - 1)
+
+
+def popcount(bits):
+    return bin(bits).count('1')
+
+
+def range_mask(start, stop):
+    # bits start through stop, inclusive
+    if stop < start:
+        return 0
+    return ((1 << (stop - start + 1)) - 1) << start
+
+
+def year_mask(year, d1, d2):
+    # the days of year that fall within [d1, d2]
+    lo = max(d1, date(year, 1, 1))
+    hi = min(d2, date(year, 12, 31))
+    if hi < lo:
+        return 0
+    return range_mask(day_bit(lo), day_bit(hi))
+
+
+def window(years, d1, d2):
+    # joins {year: bits} into a single int where bit i is day d1 + i
+    bits = 0
+    for year, year_bits in years.items():
+        year_bits &= year_mask(year, d1, d2)
+        if not year_bits:
+            continue
+        offset = (date(year, 1, 1) - d1).days
+        if offset >= 0:
+            bits |= year_bits << offset
+        else:
+            bits |= year_bits >> -offset
+    return bits
+
+
+def runs(bits):
+    # (first bit, last bit) of every run of set bits, lowest first
+    starts = bits & ~(bits << 1)
+    ends = bits & ~(bits >> 1)
+    while starts:
+        yield ((starts & -starts).bit_length() - 1,
+               (ends & -ends).bit_length() - 1)
+        starts &= starts - 1
+        ends &= ends - 1
@@ -0,0 +1,213 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# ReportCache keeps the computed report structures (stats rows, the view
+# grid, the life grid). Keys include the user's data_version, which every
+# write path bumps, so entries are never invalidated explicitly, a write
+# just makes the next read miss and the stale entries age out of the
+# backend.
+
+
+class NullBackend(object):
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def info(self):
+        return {}
+
+
+class LRUBackend(object):
+    # in-process, for a single worker, evicts the least recently used
+    # entries once the pickled values add up to more than max_bytes
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                evicted_key, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def info(self):
+        return {'entries': len(self.entries), 'bytes': self.size}
+
+
+class FileSystemBackend(object):
+    # one file per entry in a directory shared by all the workers of a dyno,
+    # files older than timeout are pruned every prune_every writes
+
+    def __init__(self, directory, timeout, prune_every=500):
+        self.directory = directory
+        self.timeout = timeout
+        self.prune_every = prune_every
+        self.writes = 0
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        name = hashlib.md5(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            if os.path.getmtime(path) < time.time() - self.timeout:
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except (IOError, OSError):
+            return None
+
+    def set(self, key, value):
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(value)
+        os.replace(tmp, self.path(key))  # readers never see half a file
+        self.writes += 1
+        if self.writes % self.prune_every == 0:
+            self.prune()
+
+    def prune(self):
+        cutoff = time.time() - self.timeout
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def info(self):
+        return {'entries': len(os.listdir(self.directory))}
+
+
+class ReportCache(object):
+
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config['REPORT_CACHE']
+        if kind == 'lru':
+            self.backend = LRUBackend(app.config['REPORT_CACHE_MAX_BYTES'])
+        elif kind == 'filesystem':
+            self.backend = FileSystemBackend(
+                app.config['REPORT_CACHE_DIR'],
+                app.config['REPORT_CACHE_TIMEOUT'])
+        else:
+            self.backend = NullBackend()
+
+    def key(self, report, user_id, version, params):
+        return '{}:{}:{}:{!r}'.format(report, user_id, version, params)
+
+    def fetch(self, report, user, params, compute):
+        # the cached value of report for user and params, or compute()'s
+        key = self.key(report, user.id, user.data_version, params)
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return pickle.loads(value)
+        self.misses += 1
+        result = compute()
+        self.backend.set(key, pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+        return result
+
+    def fetch_many(self, report, user, params_list, compute):
+        # like fetch for each of params_list, compute(missing params) gets
+        # the ones not cached all at once and returns {params: value}
+        version = user.data_version
+        keys = [self.key(report, user.id, version, params)
+                for params in params_list]
+        results, missing = {}, []
+        for params, key in zip(params_list, keys):
+            value = self.backend.get(key)
+            if value is not None:
+                self.hits += 1
+                results[params] = pickle.loads(value)
+            else:
+                self.misses += 1
+                missing.append(params)
+        if missing:
+            computed = compute(missing)
+            for params in missing:
+                self.backend.set(self.key(report, user.id, version, params),
+                                 pickle.dumps(computed[params],
+                                              pickle.HIGHEST_PROTOCOL))
+            results.update(computed)
+        return [results[params] for params in params_list]
+
+    def stats(self):
+        stats = {'hits': self.hits, 'misses': self.misses}
+        stats.update(self.backend.info())
+        return stats
+
+
+class IdentityCache(object):
+    # short lived, in-process map of user id to the detached snapshot
+    # returned by the Flask-Login user_loader, a ttl of 0 turns it off
+
+    def __init__(self, app=None):
+        self.ttl = 0
+        self.max_size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config['USER_CACHE_TTL']
+        self.max_size = app.config['USER_CACHE_MAX_SIZE']
+        self.entries.clear()
+
+    def get(self, key, load):
+        if not self.ttl:
+            return load(key)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(key)
+                return entry[1]
+        value = load(key)
+        if value is not None:
+            with self.lock:
+                self.entries[key] = (now + self.ttl, value)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+        return value
+
+    def forget(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
@@ -0,0 +1,121 @@
+import click
+from app import export as data_export
+from app import maintenance as jobs
+from app.importer import import_completions, FORMATS as IMPORT_FORMATS
+from app.models import User, Habit, Completed
+from app.sessions import sweep
+from app.storage import rows_to_bitmaps, bitmaps_to_rows
+
+
+def run_job(label, job, ranges):
+    # drives one of app.maintenance's chunked jobs with a progress bar,
+    # returns the number of rows it changed
+    changed = 0
+    with click.progressbar(job, length=len(ranges), label=label,
+                           item_show_func=lambda item: item and
+                           'up to {}'.format(item[0])) as bar:
+        for last, count in bar:
+            changed += count
+    return changed
+
+
+def register(app):
+    @app.cli.group()
+    def storage():
+        """Completion storage commands."""
+        pass
+
+    @storage.command()
+    @click.argument('target', type=click.Choice(['rows', 'bitmap']))
+    def convert(target):
+        """Rebuild the rows or bitmap table from the other one."""
+        if target == 'bitmap':
+            rows_to_bitmaps()
+        else:
+            bitmaps_to_rows()
+        click.echo('Converted completions to {}, set HABIT_STORAGE={} to '
+                   'use them'.format(target, target))
+
+    @app.cli.group()
+    def sessions():
+        """Server side session commands."""
+        pass
+
+    @sessions.command('sweep')
+    def sweep_sessions():
+        """Delete the expired server side sessions."""
+        click.echo('Deleted {} expired sessions'.format(sweep()))
+
+    @app.cli.command()
+    @click.argument('username')
+    @click.argument('table', type=click.Choice(data_export.TABLES))
+    @click.option('--format', 'fmt', type=click.Choice(data_export.FORMATS),
+                  default='csv')
+    @click.option('--output', '-o', type=click.File('w'), default='-')
+    def export(username, table, fmt, output):
+        """Stream a user's habit, completed, book or life rows."""
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.BadParameter('no such user', param_hint='username')
+        for chunk in data_export.generate(user.id, table, fmt):
+            output.write(chunk)
+
+    @app.cli.command('import')
+    @click.argument('username')
+    @click.argument('input', type=click.File('rb'))
+    @click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS),
+                  default='csv')
+    def import_(username, input, fmt):
+        """Import a user's completions from CSV or NDJSON."""
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.BadParameter('no such user', param_hint='username')
+        result = import_completions(user.id, input, fmt)
+        click.echo('Imported {rows} completions in {seconds:.1f}s '
+                   '({rows_per_second:.0f}/s), skipped {skipped} invalid '
+                   'and {duplicates} already recorded rows, created '
+                   '{habits_created} habits'.format(**result))
+
+    @app.cli.group()
+    def maintenance():
+        """Database clean up commands, safe to run on a live database."""
+        pass
+
+    chunk_option = click.option('--chunk', default=jobs.CHUNK,
+                                show_default=True,
+                                help='Keys per transaction.')
+
+    @maintenance.command()
+    @chunk_option
+    def dedupe(chunk):
+        """Delete repeated completions of a habit on the same day."""
+        ranges = jobs.key_ranges(Completed.habit_id, chunk)
+        deleted = run_job('completed', jobs.dedupe_completed(ranges), ranges)
+        click.echo('Deleted {} duplicate completions'.format(deleted))
+
+    @maintenance.command()
+    @chunk_option
+    def orphans(chunk):
+        """Delete rows whose habit or user no longer exists."""
+        for model, key, column, parent in jobs.ORPHANS:
+            ranges = jobs.key_ranges(key, chunk)
+            deleted = run_job(model.__tablename__, jobs.purge_orphans(
+                model, key, column, parent, ranges), ranges)
+            click.echo('Deleted {} orphaned {} rows'.format(
+                deleted, model.__tablename__))
+
+    @maintenance.command()
+    @chunk_option
+    def backfill(chunk):
+        """Rebuild the habit totals and streaks from the completions."""
+        ranges = jobs.key_ranges(Habit.id, chunk)
+        habits = run_job('habits', jobs.backfill(ranges), ranges)
+        click.echo('Rebuilt the totals and streaks of {} habits'.format(
+            habits))
+
+    @maintenance.command()
+    @click.option('--vacuum/--no-vacuum', default=True,
+                  help='Also VACUUM, on SQLite it blocks writes meanwhile.')
+    def optimize(vacuum):
+        """Run VACUUM and ANALYZE."""
+        click.echo('Ran {}'.format(' and '.join(jobs.optimize(vacuum))))
@@ -1,17 +1,135 @@
-from threading import Thread
-from flask import current_app
+import atexit
+import os
+import queue
+import threading
+import time
 from flask_mail import Message
 from app import mail
 
+_STOP = object()  # tells a worker to exit once the mail before it is sent
 
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
+
+class MailDispatcher(object):
+    # a bounded queue drained by a fixed pool of worker threads, each keeping
+    # its SMTP connection open for as long as there is mail to send
+
+    def __init__(self, app=None):
+        self.app = None
+        self.queue = None
+        self.workers = []
+        self.pid = None
+        self.lock = threading.Lock()
+        # once per dispatcher, not per app, create_app runs again and again
+        # in tests and scripts
+        atexit.register(self.shutdown)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # workers running for an earlier app block on its queue and send
+        # with its config, they're stopped here and start() brings up new
+        # ones for this app
+        self.shutdown()
+        self.app = app
+        self.queue = queue.Queue(app.config['MAIL_QUEUE_SIZE'])
+
+    def start(self):
+        # workers are started on first use in each process, threads don't
+        # survive the fork of a preloaded gunicorn master, Flask-Mail is
+        # only set up then too
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            if 'mail' not in self.app.extensions:
+                mail.init_app(self.app)
+            self.pid = os.getpid()
+            self.workers = [
+                threading.Thread(target=self.work, daemon=True,
+                                 name='mail-{}'.format(i))
+                for i in range(self.app.config['MAIL_WORKERS'])]
+            for worker in self.workers:
+                worker.start()
+
+    def send(self, msg):
+        # blocks for up to MAIL_QUEUE_TIMEOUT when the queue is full, then
+        # gives up on the message
+        self.start()
+        try:
+            self.queue.put(msg, timeout=self.app.config['MAIL_QUEUE_TIMEOUT'])
+        except queue.Full:
+            self.app.logger.error('Mail queue full, dropped "%s" to %s',
+                                  msg.subject, ', '.join(msg.recipients))
+            return False
+        return True
+
+    def work(self):
+        with self.app.app_context():
+            while True:
+                msg = self.queue.get()
+                if msg is _STOP:
+                    return
+                if self.deliver(msg) is _STOP:
+                    return
+
+    def deliver(self, msg):
+        # sends msg and whatever else arrives within MAIL_IDLE_TIMEOUT over
+        # one connection, reconnecting with exponential backoff on errors,
+        # returns _STOP if it was dequeued meanwhile
+        config = self.app.config
+        attempt = 0
+        while msg is not None:
+            try:
+                with mail.connect() as conn:
+                    while msg is not None:
+                        conn.send(msg)
+                        attempt = 0
+                        msg = self.next(config['MAIL_IDLE_TIMEOUT'])
+                        if msg is _STOP:
+                            return _STOP
+            except Exception:
+                if msg is None:  # sent, failed to close the connection
+                    return
+                attempt += 1
+                if attempt > config['MAIL_RETRIES']:
+                    self.app.logger.exception(
+                        'Failed to send "%s" to %s', msg.subject,
+                        ', '.join(msg.recipients))
+                    msg, attempt = self.next(0), 0
+                    if msg is _STOP:
+                        return _STOP
+                    continue
+                time.sleep(config['MAIL_RETRY_BACKOFF'] * 2 ** (attempt - 1))
+
+    def next(self, timeout):
+        try:
+            if not timeout:
+                return self.queue.get_nowait()
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def shutdown(self, timeout=None):
+        # drains the queue: the stop markers go in behind the waiting mail
+        if self.pid != os.getpid():
+            return
+        if timeout is None:
+            timeout = self.app.config['MAIL_DRAIN_TIMEOUT']
+        deadline = time.time() + timeout
+        for worker in self.workers:
+            try:
+                self.queue.put(_STOP, timeout=max(deadline - time.time(), 0))
+            except queue.Full:
+                break
+        for worker in self.workers:
+            worker.join(max(deadline - time.time(), 0))
+        self.pid = None
+
+
+mail_dispatcher = MailDispatcher()
 
 
 def send_email(subject, sender, recipients, text_body, html_body):
     msg = Message(subject, sender=sender, recipients=recipients)
     msg.body = text_body
     msg.html = html_body
-    Thread(target=send_async_email,
-           args=(current_app._get_current_object(), msg)).start()
+    mail_dispatcher.send(msg)
@@ -0,0 +1,82 @@
+import threading
+import weakref
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+# Engine profiles picked with DATABASE_PROFILE. 'sqlite' pools the
+# connections and sets SQLITE_PRAGMAS on each new one (WAL, relaxed sync,
+# a busy timeout instead of "database is locked", a bigger page cache and
+# mmap). 'postgres' sizes the pool of each gunicorn worker so that all of
+# them fit in DATABASE_MAX_CONNECTIONS, pings connections before use,
+# recycles them and caps statements at DATABASE_STATEMENT_TIMEOUT. 'auto'
+# picks by the database url, 'none' leaves the driver defaults.
+
+
+def profile_name(app, backend):
+    name = app.config['DATABASE_PROFILE']
+    if name == 'auto':
+        if backend == 'sqlite':
+            return 'sqlite'
+        if backend in ('postgres', 'postgresql'):
+            return 'postgres'
+        return 'none'
+    return name
+
+
+def in_memory(url):
+    return url.database in (None, '', ':memory:')
+
+
+class TunedSQLAlchemy(SQLAlchemy):
+
+    def __init__(self, *args, **kwargs):
+        self.tuned = weakref.WeakSet()
+        self.tuning = threading.Lock()
+        super(TunedSQLAlchemy, self).__init__(*args, **kwargs)
+
+    def apply_driver_hacks(self, app, info, options):
+        # Flask-SQLAlchemy 2.3 returns None, later versions (url, options),
+        # options is changed in place either way
+        rv = super(TunedSQLAlchemy, self).apply_driver_hacks(app, info,
+                                                             options)
+        config = app.config
+        profile = profile_name(app, info.get_backend_name())
+        if profile == 'sqlite' and not in_memory(info):
+            # the default for files opens a connection per checkout, which
+            # loses the pragmas and the page cache every time
+            options['poolclass'] = QueuePool
+            options.setdefault('connect_args', {})['check_same_thread'] = \
+                False
+        elif profile == 'postgres':
+            per_worker = max(config['DATABASE_MAX_CONNECTIONS'] //
+                             config['WEB_CONCURRENCY'], 2)
+            options['pool_size'] = per_worker // 2
+            options['max_overflow'] = per_worker - per_worker // 2
+            options['pool_pre_ping'] = True
+            options['pool_recycle'] = config['DATABASE_POOL_RECYCLE']
+            options.setdefault('connect_args', {})['options'] = \
+                '-c statement_timeout={}'.format(
+                    config['DATABASE_STATEMENT_TIMEOUT'])
+        return rv
+
+    def get_engine(self, app=None, bind=None):
+        engine = super(TunedSQLAlchemy, self).get_engine(app, bind)
+        if engine in self.tuned:
+            return engine
+        with self.tuning:  # before anyone gets to connect with it
+            if engine not in self.tuned:
+                app = self.get_app(app)
+                if profile_name(app, engine.name) == 'sqlite':
+                    listen_pragmas(engine, app.config['SQLITE_PRAGMAS'])
+                self.tuned.add(engine)
+        return engine
+
+
+def listen_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas:
+            cursor.execute('PRAGMA {} = {}'.format(pragma, value))
+        cursor.close()
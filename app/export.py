@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+from datetime import date
+from app import db
+from app.models import Habit, Book, Life
+from app.storage import get_store
+
+TABLES = ['habit', 'completed', 'book', 'life']
+FORMATS = ['csv', 'ndjson']
+MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+BATCH = 1000  # rows fetched per round trip
+
+
+def rows(user_id, table):
+    # (columns, iterator of tuples), rows are streamed rather than loaded so
+    # the memory used doesn't depend on the size of the account
+    if table == 'completed':
+        return ['habit_id', 'date'], get_store().iter_completed(user_id)
+    columns = {
+        'habit': [Habit.id, Habit.habit, Habit.start_date, Habit.end_date,
+                  Habit.schedule, Habit.schedule_value],
+        'book': [Book.id, Book.title, Book.author, Book.date],
+        'life': [Life.year, Life.week, Life.content],
+    }[table]
+    model = columns[0].class_
+    query = db.session.query(*columns).filter(
+        model.user_id == user_id).order_by(*columns[:2]).yield_per(BATCH)
+    return [column.key for column in columns], query
+
+
+def _csv_lines(names, records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    yield buffer.getvalue()  # on its own, so an empty table still has it
+    buffer.seek(0)
+    buffer.truncate()
+    for record in records:
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+def _ndjson_lines(names, records):
+    for record in records:
+        yield json.dumps(dict(zip(names, record)),
+                         default=_json_default) + '\n'
+
+
+def generate(user_id, table, fmt):
+    # yields the export as text chunks of roughly BATCH rows each
+    names, records = rows(user_id, table)
+    lines = _csv_lines if fmt == 'csv' else _ndjson_lines
+    chunk = []
+    for line in lines(names, records):
+        chunk.append(line)
+        if len(chunk) >= BATCH:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
@@ -0,0 +1,68 @@
+from datetime import date, timedelta
+
+# A year of completions as a GitHub style SVG heatmap: a column per week,
+# Sunday on top, days shaded by how many habits were done out of most.
+# Each cell is the stroke of a vertical line 8 units wide and long, and
+# a run of days of the same shade down a column is a single line dashed
+# "8 2", so a year comes to a few KB however full it is.
+
+CELL = 10
+EMPTY = '#ebedf0'
+SHADES = ['#c6e48b', '#7bc96f', '#239a3b', '#196127']
+SVG = ('<svg xmlns="http://www.w3.org/2000/svg" width="{width}" '
+       'height="{height}" viewBox="0 0 {width} {height}" fill="none" '
+       'stroke-width="8" stroke-dasharray="8 2">{paths}</svg>')
+PATH = '<path stroke="{}" d="{}"/>'
+
+
+def cell(day, first):
+    # (column, row) of day, first being the Sunday the year's grid starts on
+    return (day - first).days // 7, (day.weekday() + 1) % 7
+
+
+def shade(count, most):
+    # index into SHADES, or None for a day without any
+    if count <= 0:
+        return None
+    return min((count * len(SHADES) - 1) // max(most, 1), len(SHADES) - 1)
+
+
+def line(column, top, bottom):
+    # the path data of rows top through bottom of column
+    return 'M{} {}V{}'.format(column * CELL + CELL // 2, top * CELL + 1,
+                              bottom * CELL + CELL - 1)
+
+
+def render(year, counts, most):
+    # counts[i] is how many were done on the i-th day of year
+    jan1 = date(year, 1, 1)
+    first = jan1 - timedelta((jan1.weekday() + 1) % 7)
+    days = (date(year, 12, 31) - jan1).days + 1
+    columns = cell(date(year, 12, 31), first)[0] + 1
+
+    background = []
+    for column in range(columns):
+        top = 0 if column else cell(jan1, first)[1]
+        bottom = 6 if column < columns - 1 else \
+            cell(date(year, 12, 31), first)[1]
+        background.append(line(column, top, bottom))
+
+    shaded = [[] for level in SHADES]
+    run = None  # (level, column, top row, bottom row)
+    for i in range(days):
+        column, row = cell(jan1 + timedelta(i), first)
+        level = shade(counts[i] if i < len(counts) else 0, most)
+        if run and run[0] == level and run[1] == column:
+            run = run[:3] + (row,)
+            continue
+        if run and run[0] is not None:
+            shaded[run[0]].append(line(*run[1:]))
+        run = (level, column, row, row)
+    if run and run[0] is not None:
+        shaded[run[0]].append(line(*run[1:]))
+
+    paths = [PATH.format(EMPTY, ''.join(background))]
+    paths += [PATH.format(SHADES[level], ''.join(shaded[level]))
+              for level in range(len(SHADES)) if shaded[level]]
+    return SVG.format(width=columns * CELL, height=7 * CELL,
+                      paths=''.join(paths))
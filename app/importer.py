@@ -0,0 +1,121 @@
+import csv
+import json
+import time
+from datetime import date
+from app import db
+from app.models import User, Habit
+from app.storage import get_store
+
+FORMATS = ['csv', 'ndjson']
+BATCH = 10000  # rows per insert statement and per transaction
+
+
+def decode_lines(lines, result):
+    # UTF-8 text of lines that may be bytes, lines that can't be decoded
+    # are counted as skipped; the byte order mark spreadsheets put in front
+    # of the first line would otherwise end up in the first column's name
+    first = True
+    for line in lines:
+        if isinstance(line, bytes):
+            try:
+                line = line.decode('utf-8')
+            except UnicodeDecodeError:
+                result['skipped'] += 1
+                continue
+        if first:
+            line, first = line.lstrip('\ufeff'), False
+        yield line
+
+
+def read_records(lines, fmt):
+    # yields (habit name, date string) from an iterable of text lines, CSV
+    # needs a header with habit and date columns, NDJSON objects the same
+    # keys; records that can't be read come out as (None, None)
+    if fmt == 'csv':
+        for row in csv.DictReader(lines):
+            yield row.get('habit'), row.get('date')
+    else:
+        for line in lines:
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if isinstance(record, dict):
+                    yield record.get('habit'), record.get('date')
+                else:
+                    yield None, None
+
+
+def start_earlier(earliest):
+    # moves habits' start dates back to the first day imported for them,
+    # so none of their history falls before the start, no commit
+    for habit_id, day in earliest.items():
+        Habit.query.filter(Habit.id == habit_id).filter(
+            Habit.start_date > day).update({Habit.start_date: day},
+                                           synchronize_session=False)
+    earliest.clear()
+
+
+def import_completions(user_id, lines, fmt, batch=BATCH):
+    # streams the records into the user's completions, habits are looked up
+    # by name once and created when missing, rows already recorded are
+    # skipped, each batch is committed on its own so no transaction grows
+    # with the size of the file
+    start = time.time()
+    store = get_store()
+    habits = {name: id for id, name in db.session.query(
+        Habit.id, Habit.habit).filter(Habit.user_id == user_id)}
+    created = {}
+    touched = set()
+    result = {'rows': 0, 'read': 0, 'skipped': 0, 'habits_created': 0}
+    earliest = {}  # habit id: first day imported
+    pending = []
+    committed = set()  # touched habits whose rows are committed
+    try:
+        for name, value in read_records(decode_lines(lines, result), fmt):
+            try:  # '%Y-%m-%d', a lot quicker than strptime
+                day = date(*map(int, value.split('-')))
+            except (AttributeError, TypeError, ValueError, OverflowError):
+                day = None
+            if not name or not isinstance(name, str) or day is None:
+                result['skipped'] += 1
+                continue
+            habit_id = habits.get(name)
+            if habit_id is None:
+                habit = Habit(habit=name, start_date=day, user_id=user_id)
+                db.session.add(habit)
+                db.session.flush()
+                habit_id = habits[name] = habit.id
+                created[habit_id] = habit
+            if day < earliest.get(habit_id, date.max):
+                earliest[habit_id] = day
+            pending.append((habit_id, day))
+            touched.add(habit_id)
+            if len(pending) >= batch:
+                result['rows'] += store.bulk_add(pending)
+                start_earlier(earliest)
+                db.session.commit()
+                committed |= touched
+                result['read'] += len(pending)
+                pending = []
+        if pending:
+            result['rows'] += store.bulk_add(pending)
+            start_earlier(earliest)
+            result['read'] += len(pending)
+        committed = touched
+    except Exception:
+        # the batch in progress is lost, the ones before it are not
+        db.session.rollback()
+        raise
+    finally:
+        # keeps the derived data and cached reports in step with whatever
+        # got in, even when the import stops half way
+        store.refresh(committed)
+        User.query.get(user_id).bump_data_version()
+        db.session.commit()
+    result['habits_created'] = len(created)
+    result['duplicates'] = result['read'] - result['rows']
+    result['seconds'] = time.time() - start
+    result['rows_per_second'] = result['read'] / max(result['seconds'], 1e-6)
+    return result
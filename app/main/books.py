@@ -0,0 +1,65 @@
+import re
+from datetime import date
+from sqlalchemy import and_, or_, text
+from app import db
+from app.models import Book
+
+# the book log, a page at a time and searched by title and author
+
+
+def parse_cursor(value):
+    # 'YYYY-MM-DD.id' as given to the older link, None if missing or bad
+    try:
+        day, id = value.split('.')
+        return date(*map(int, day.split('-'))), int(id)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def page_of_books(user_id, per_page, before=None):
+    # (books newest first, cursor of the next page or None), the page starts
+    # after the (date, id) in before, which the index reaches directly
+    # whatever page it is
+    query = Book.query.filter_by(user_id=user_id)
+    if before is not None:
+        day, id = before
+        query = query.filter(or_(Book.date < day,
+                                 and_(Book.date == day, Book.id < id)))
+    books = query.order_by(Book.date.desc(), Book.id.desc()).limit(
+        per_page + 1).all()
+    cursor = None
+    if len(books) > per_page:
+        books = books[:per_page]
+        last = books[-1]
+        cursor = '{}.{}'.format(last.date.strftime('%Y-%m-%d'), last.id)
+    return books, cursor
+
+
+def search_books(user_id, q, limit):
+    # books whose title or author have words starting with each word of q,
+    # newest first like the log, ranking every match costs more than the
+    # search itself
+    words = re.findall(r'\w+', q)
+    if not words:
+        return []
+    query = Book.query.filter_by(user_id=user_id)
+    dialect = db.engine.name
+    if dialect == 'sqlite':
+        # the + keeps SQLite walking the user's (date, id) index, newest
+        # first, rather than looking up every match by id and sorting them
+        query = query.filter(text(
+            '+book.id IN (SELECT rowid FROM book_fts '
+            'WHERE book_fts MATCH :match)')).params(
+            match=' '.join('"{}"*'.format(word) for word in words))
+    elif dialect == 'postgresql':
+        query = query.filter(text(
+            "to_tsvector('simple', coalesce(book.title, '') || ' ' || "
+            "coalesce(book.author, '')) @@ to_tsquery('simple', :match)")
+        ).params(match=' & '.join(word + ':*' for word in words))
+    else:
+        for word in words:
+            pattern = '%{}%'.format(word)
+            query = query.filter(or_(Book.title.ilike(pattern),
+                                     Book.author.ilike(pattern)))
+    return query.order_by(Book.date.desc(), Book.id.desc()).limit(
+        limit).all()
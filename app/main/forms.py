@@ -1,12 +1,42 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired
 from wtforms import StringField, SubmitField, SelectField, \
                     SelectMultipleField, IntegerField, TextAreaField, widgets
 from wtforms.fields.html5 import DateField
-from wtforms.validators import DataRequired, Optional
+from wtforms.validators import DataRequired, Optional, NumberRange
 from datetime import date
-
-
-class CreateForm(FlaskForm):
+from flask import request
+from app.schedules import SCHEDULES, WEEKDAY_NAMES, DAILY, WEEKDAYS, \
+    WEEKLY, INTERVAL
+
+
+class ScheduleForm(FlaskForm):
+    # the fields of a habit's schedule, only the chosen one is required
+    schedule = SelectField('Repeat', choices=SCHEDULES, default=DAILY)
+    weekdays = SelectMultipleField('On', coerce=int,
+                                   choices=list(enumerate(WEEKDAY_NAMES)),
+                                   widget=widgets.ListWidget(
+                                       prefix_label=False),
+                                   option_widget=widgets.CheckboxInput())
+    times = IntegerField('Times a week',
+                         validators=[Optional(), NumberRange(1, 7)])
+    every = IntegerField('Every how many days',
+                         validators=[Optional(), NumberRange(1)])
+
+    def validate(self):
+        # after the field validators, Optional() stops the chain of an
+        # empty field before any validate_<field> could see it
+        if not super(ScheduleForm, self).validate():
+            return False
+        field = {WEEKDAYS: self.weekdays, WEEKLY: self.times,
+                 INTERVAL: self.every}.get(self.schedule.data)
+        if field is not None and not field.data:
+            field.errors.append('Required for this schedule')
+            return False
+        return True
+
+
+class CreateForm(ScheduleForm):
     habit = StringField('Habit', validators=[DataRequired('something')])
     # how do I make "description" visibile to users?
     start_date = DateField('Start Date', default=date.today,
@@ -18,7 +48,7 @@ class CreateForm(FlaskForm):
     submit = SubmitField('Submit')
 
 
-class EditForm(FlaskForm):  # Could I just inherit CreateForm?
+class EditForm(ScheduleForm):  # Could I just inherit CreateForm?
     habit = StringField('Habit', validators=[DataRequired()])
     start_date = DateField('Start Date', validators=[Optional()])
     end_date = DateField('End Date', validators=[Optional()])
@@ -57,6 +87,26 @@ class DateRangeForm(FlaskForm):
 
 class WeekForm(FlaskForm):
     year = IntegerField('Year', validators=[DataRequired()])
-    week = IntegerField('Week', validators=[DataRequired()])
+    week = IntegerField('Week', validators=[DataRequired(),
+                                            NumberRange(1, 53)])
     content = TextAreaField('Content', validators=[DataRequired()])
     submit = SubmitField('Submit')
+
+
+class ImportForm(FlaskForm):
+    file = FileField('File', validators=[FileRequired()])
+    format = SelectField('Format', choices=[('csv', 'CSV'),
+                                            ('ndjson', 'NDJSON')])
+    submit = SubmitField('Import Completed Habits')
+
+
+class SearchForm(FlaskForm):
+    # submitted with GET, like a search box
+    q = StringField('Search', validators=[DataRequired()])
+
+    def __init__(self, *args, **kwargs):
+        if 'formdata' not in kwargs:
+            kwargs['formdata'] = request.args
+        if 'meta' not in kwargs:
+            kwargs['meta'] = {'csrf': False}
+        super(SearchForm, self).__init__(*args, **kwargs)
@@ -0,0 +1,118 @@
+from datetime import date
+from app.heatmap import render
+from app.models import Habit, Life
+from app.schedules import due_count, done_count, DAILY, WEEKLY
+from app.storage import get_store
+from app.streaks import habit_schedules, habit_streaks, current_streaks
+
+# the structures behind /stats, /view and /life, built from plain values so
+# they can be cached by app.cache.ReportCache
+
+
+def stats_rows(user_id, today):
+    # [(habit, days due, completed, percent, current streak, longest
+    # streak, its first day, its last day)], the streaks are None for
+    # weekly habits which can be done on any day
+    store = get_store()
+    # first, as it may commit the rows of habits it hadn't seen yet
+    habits = habit_schedules(Habit.user_id == user_id)
+    streaks = habit_streaks(store, habits)
+    current = current_streaks(store, habits, streaks, today)
+    totals = store.totals(user_id, today)
+    # habits on other schedules only count the completions of due days,
+    # their days are read as bitmaps from the earliest start on
+    scheduled = [habit for habit, counter in totals
+                 if habit.schedule != DAILY and habit.start_date <= today]
+    if scheduled:
+        d1 = min(habit.start_date for habit in scheduled)
+        bitmaps = store.bitmaps([habit.id for habit in scheduled], d1, today)
+    stats = []
+    for habit, counter in totals:
+        total = due_count(habit, habit.start_date, today)
+        if habit in scheduled:
+            counter = done_count(
+                habit, bitmaps[habit.id] >> (habit.start_date - d1).days,
+                habit.start_date, min(today, habit.end_date))
+        if total > 0:  # rounded to the nearest whole percent
+            percent = (counter * 200 + total) // (total * 2)
+        else:
+            percent = 0
+        streak = streaks[habit.id]
+        if habit.schedule == WEEKLY:
+            stats.append((habit.habit, total, counter, percent, None, None,
+                          None, None))
+            continue
+        stats.append((habit.habit, total, counter, percent,
+                      current[habit.id], streak.longest,
+                      streak.longest_start, streak.longest_end))
+    return stats
+
+
+def view_grid(user_id, d1, d2):
+    # (first day shown, [(habit, bitmap of its days from there)]), the range
+    # starts no earlier than the earliest habit, the bitmaps keep the cached
+    # value small however long the range is
+    all_habits = Habit.query.filter_by(user_id=user_id).all()
+    if all_habits:  # earliest start
+        d1 = max(d1, min([habit.start_date for habit in all_habits]))
+
+    shown = [habit for habit in all_habits
+             if not (habit.end_date < d1 or habit.start_date > d2)]
+    bitmaps = get_store().bitmaps([habit.id for habit in shown], d1, d2)
+    return d1, [(habit.habit, bitmaps[habit.id]) for habit in shown]
+
+
+def view_rows(habits, days):
+    # yields (habit, 'X' or '' for each day) a row at a time for the template
+    for name, bits in habits:
+        yield name, ('X' if bits >> i & 1 else '' for i in range(days))
+
+
+def year_habits(user_id, year):
+    # the user's habits running on any day of year
+    return Habit.query.filter_by(user_id=user_id).filter(
+        Habit.start_date <= date(year, 12, 31)).filter(
+        Habit.end_date >= date(year, 1, 1)).order_by(Habit.id).all()
+
+
+def habit_heatmaps(habit_ids, year):
+    # {habit_id: SVG heatmap of year}, from a single query
+    d1, d2 = date(year, 1, 1), date(year, 12, 31)
+    bitmaps = get_store().bitmaps(habit_ids, d1, d2)
+    return {habit_id: render(year, [bits >> i & 1 for i in range(366)], 1)
+            for habit_id, bits in bitmaps.items()}
+
+
+def combined_heatmap(habit_ids, year):
+    # SVG heatmap of year shaded by the share of habit_ids done each day
+    counts = get_store().day_counts(habit_ids, date(year, 1, 1),
+                                    date(year, 12, 31))
+    return render(year, counts, len(habit_ids))
+
+
+def life_grid(user_id):
+    # (first year, last year + 1, {year: [content or '' for weeks 1-53]}),
+    # or None without any entries
+    weeks = Life.query.filter_by(user_id=user_id).order_by(
+        Life.year, Life.week).all()
+    if not weeks:
+        return None
+    fy = weeks[0].year  # first year
+    ly = weeks[-1].year + 1  # last year adjusted for range function
+    # one row of 53 weeks (ISO years can have a week 53) for every
+    # year with an entry, years without any stay empty
+    life = {year: [] for year in range(fy, ly)}
+    for week in weeks:
+        if not 1 <= week.week <= 53:
+            continue
+        if not life[week.year]:
+            life[week.year] = [''] * 53
+        life[week.year][week.week - 1] = week.content
+    return fy, ly, life
+
+
+def life_rows(life):
+    # yields (year, content or '' for weeks 1-53) for the years with entries
+    for year in sorted(life):
+        if life[year]:
+            yield year, life[year]
@@ -1,12 +1,25 @@
-from flask import session, render_template, flash, redirect, url_for, request
-from app import db
+from flask import session, render_template, flash, redirect, url_for, \
+    request, g, Response, stream_with_context, current_app, \
+    get_flashed_messages, make_response, abort
+from app import db, report_cache
 from app.main.forms import CreateForm, SelectHabitForm, EditForm, \
-    CompleteForm, SelectDateForm, BookForm, DateRangeForm, WeekForm
+    CompleteForm, SelectDateForm, BookForm, DateRangeForm, WeekForm, \
+    ImportForm, SearchForm
 from flask_login import current_user, login_required
-from app.models import Habit, Completed, Book, Life
+from app.models import Habit, Book, Life
+from app.storage import get_store
+from app.streaks import rebuild_streaks
+from app.schedules import is_due, weekday_mask, mask_weekdays, WEEKDAYS, \
+    WEEKLY, INTERVAL
+from app.main.books import page_of_books, parse_cursor, search_books
+from app.main.reports import stats_rows, view_grid, view_rows, life_grid, \
+    life_rows, year_habits, habit_heatmaps, combined_heatmap
+from app import export
+from app.importer import import_completions
 from datetime import date, timedelta
+import hashlib
+import time
 from app.main import bp
-from decimal import Decimal, getcontext
 
 
 # the "sessions" started could be a security hazard,
@@ -21,20 +34,70 @@ def date_from_string(day):
     return day
 
 
+def render_report(template, **context):
+    # like render_template, but with STREAM_TEMPLATES set the page is sent
+    # as it is rendered, the rows given in context are generators so it is
+    # never held in memory whole
+    if not current_app.config['STREAM_TEMPLATES']:
+        return render_template(template, **context)
+    get_flashed_messages()  # taken out of the session before it is saved
+    app = current_app._get_current_object()
+    app.update_template_context(context)
+    return Response(stream_with_context(
+        app.jinja_env.get_template(template).generate(context)))
+
+
+def report_etag(*params):
+    # ETag of a report page for the current user, made of the user's data
+    # version, which every write bumps, and what else the page depends on:
+    # params, the session's CSRF token and a time bucket short enough that
+    # a cached form's token has not expired. None for POSTs and when
+    # flashed messages are waiting to be shown
+    if request.method != 'GET' or '_flashes' in session:
+        return None
+    limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600) or 3600
+    key = (request.endpoint, current_user.id, current_user.data_version,
+           params, session.get('csrf_token'), int(time.time() // (limit / 2)))
+    return hashlib.md5(repr(key).encode('utf-8')).hexdigest()
+
+
+def not_modified(etag):
+    # a 304 when the browser's copy of the page is still current
+    if etag is not None and etag in request.if_none_match:
+        return with_etag(Response(status=304), etag)
+
+
+def with_etag(response, etag):
+    if etag is not None:
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    return response
+
+
 def habits_given_date(day):
-    # accepts datetime.date or string
+    # accepts datetime.date or string, the result is kept for the rest of
+    # the request so the form's validation pass doesn't query it again
     if type(day) == str:
         day = date_from_string(day)
-    all_habits = Habit.query.filter_by(user_id=current_user.id).all()
-    days_habits = []
-    for habit in all_habits:
-        if habit.start_date <= day <= habit.end_date:
-            days_habits.append(habit)
-    return days_habits
+    cache = g.setdefault('days_habits', {})
+    key = (current_user.id, day)
+    if key not in cache:
+        habits = Habit.query.filter_by(user_id=current_user.id).filter(
+            Habit.start_date <= day).filter(Habit.end_date >= day)
+        cache[key] = [habit for habit in habits if is_due(habit, day)]
+    return cache[key]
+
+
+def set_schedule(habit, form):
+    habit.schedule = form.schedule.data
+    habit.schedule_value = {
+        WEEKDAYS: weekday_mask(form.weekdays.data or []),
+        WEEKLY: form.times.data,
+        INTERVAL: form.every.data,
+    }.get(habit.schedule)
 
 
-# still need to prepopulate with completed habits,
-# check them against submitted data, and edit database accordingly
 @bp.route('/', methods=['GET', 'POST'])
 @bp.route('/index', methods=['GET', 'POST'])
 @login_required
@@ -52,30 +115,19 @@ def index():
     hform.habits.choices = [(x.id, x.habit) for x in days_habits]
 
     # prepopulate habits
+    store = get_store()
+    habit_ids = [habit.id for habit in days_habits]
     if request.method == 'GET':
-        habit_ids = [habit.id for habit in days_habits]
-        completed = Completed.query.filter_by(
-            date=ddate).filter(Completed.habit_id.in_(habit_ids)).all()
-        selected = [i.habit_id for i in completed]
-        hform.habits.data = selected
-        session['done'] = selected
-
-    # submit update to completed habits
+        hform.habits.data = sorted(store.completed_on(ddate, habit_ids))
+
+    # submit update to completed habits, diffed against what is stored for
+    # the day and applied in a single transaction
     if hform.validate_on_submit() and hform.submit.data:
-        previous = session['done']
-        done = hform.habits.data  # checked boxes
-        for id in done:
-            if id in previous:
-                done.remove(id)
-                previous.remove(id)
-        for id in done:
-            x = Completed(date=ddate, habit_id=id)
-            db.session.add(x)
-            db.session.commit()
-        for id in previous:
-            x = Completed.query.filter_by(date=ddate).filter_by(habit_id=id)
-            db.session.delete(x[0])
-            db.session.commit()
+        previous = store.completed_on(ddate, habit_ids)
+        done = set(hform.habits.data)  # checked boxes
+        store.apply(ddate, done - previous, previous - done)
+        current_user.bump_data_version()
+        db.session.commit()
         flash('Completed Habits Updated')
         return redirect(url_for('main.index'))
 
@@ -96,7 +148,9 @@ def create():
     if form.validate_on_submit():
         habit = Habit(habit=form.habit.data, start_date=form.start_date.data,
                       end_date=form.end_date.data, user_id=current_user.id)
+        set_schedule(habit, form)
         db.session.add(habit)
+        current_user.bump_data_version()
         db.session.commit()
         flash('New habit created')
         return redirect(url_for('main.index'))
@@ -121,12 +175,21 @@ def select_habit():
 def edit():
     x = session['habit']
     habit = Habit.query.filter_by(id=x).first()
+    value = habit.schedule_value
     form = EditForm(habit=habit.habit, start_date=habit.start_date,
-                    end_date=habit.end_date)
+                    end_date=habit.end_date, schedule=habit.schedule,
+                    weekdays=mask_weekdays(value or 0)
+                    if habit.schedule == WEEKDAYS else [],
+                    times=value if habit.schedule == WEEKLY else None,
+                    every=value if habit.schedule == INTERVAL else None)
     if form.validate_on_submit():
         habit.habit = form.habit.data
         habit.start_date = form.start_date.data
         habit.end_date = form.end_date.data
+        set_schedule(habit, form)
+        # the runs depend on the days it is due
+        rebuild_streaks(get_store(), [habit.id])
+        current_user.bump_data_version()
         db.session.commit()
         flash('Habit edited')
         return redirect(url_for('main.index'))
@@ -138,39 +201,54 @@ def edit():
 def stats():
     # for each habit display totals as a fraction and percentage
     today = date.today()
-    all_habits = Habit.query.filter_by(user_id=current_user.id).all()
-    hlist, tlist, clist, plist = [], [], [], []
-    for habit in all_habits:
-        hlist.append(habit.habit)
-        difference = today - habit.start_date
-        total = difference.days + 1  # add one for fence-post problem
-        tlist.append(total)
-        completed = Completed.query.filter_by(habit_id=habit.id).all()
-        counter = 0
-        for instance in completed:
-            if instance.date <= today:
-                counter += 1
-        clist.append(counter)
-        getcontext().prec = 2
-        percent = int(Decimal(counter) / Decimal(total) * 100)
-        plist.append(percent)
-    stats = list(zip(hlist, tlist, clist, plist))
-    return render_template('stats.html', title='Habit Stats', stats=stats)
+    etag = report_etag(today)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    stats = report_cache.fetch('stats_streaks', current_user, (today,),
+                               lambda: stats_rows(current_user.id, today))
+    return with_etag(make_response(render_template(
+        'stats.html', title='Habit Stats', stats=stats)), etag)
 
 
 @bp.route('/book', methods=['GET', 'POST'])
 @login_required
 def book():
+    before = request.args.get('before')
+    etag = report_etag(before)
+    cached = not_modified(etag)
+    if cached:
+        return cached
     form = BookForm()
-    books = Book.query.filter_by(user_id=current_user.id).all()
     if form.validate_on_submit():
         book = Book(title=form.title.data, author=form.author.data,
                     date=form.date.data, user_id=current_user.id)
         db.session.add(book)
+        current_user.bump_data_version()
         db.session.commit()
         flash('Book Log Updated')
         return redirect(url_for('main.index'))
-    return render_template('book.html', title='Books', form=form, books=books)
+    books, cursor = page_of_books(current_user.id,
+                                  current_app.config['BOOKS_PER_PAGE'],
+                                  parse_cursor(before))
+    older_url = url_for('main.book', before=cursor) if cursor else None
+    newest_url = url_for('main.book') if before else None
+    return with_etag(make_response(render_template(
+        'book.html', title='Books', form=form, books=books,
+        search_form=SearchForm(), older_url=older_url,
+        newest_url=newest_url)), etag)
+
+
+@bp.route('/book/search')
+@login_required
+def book_search():
+    form = SearchForm()
+    if not form.validate():
+        return redirect(url_for('main.book'))
+    books = search_books(current_user.id, form.q.data,
+                         current_app.config['BOOKS_PER_PAGE'])
+    return render_template('book_search.html', title='Search Books',
+                           form=form, books=books)
 
 
 @bp.route('/view', methods=['GET', 'POST'])
@@ -194,40 +272,24 @@ def view():
             session['d1'] = d2.strftime('%Y-%m-%d')
         return redirect(url_for('main.view'))
 
-    all_habits = Habit.query.filter_by(user_id=current_user.id).all()
-    esdate = min([habit.start_date for habit in all_habits])  # earliest start
     if d2 > date.today():
         d2 = date.today()
-    if d1 < esdate:
-        d1 = esdate
+    etag = report_etag(d1, d2)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    start, habits = report_cache.fetch(
+        'view_bits', current_user, (d1, d2),
+        lambda: view_grid(current_user.id, d1, d2))
+    if d1 < start:
+        d1 = start
         flash('No habit starts before ' + d1.strftime('%Y-%m-%d'))
 
     delta = d2 - d1
     date_range = [d1 + timedelta(i) for i in range(delta.days + 1)]
-
-    # create a dictionary of habits with completed dates
-    habits = {}
-    counter = 1
-    for habit in all_habits:
-        if habit.end_date < d1 or habit.start_date > d2:
-            pass
-        else:
-            habits[counter] = [habit]
-            completed = Completed.query.filter_by(habit_id=habit.id).all()
-            completed_dates = [c.date for c in completed]
-            for day in date_range:
-                if completed:
-                    if day in completed_dates:
-                        habits[counter].append('X')
-                    else:
-                        habits[counter].append('')
-                else:
-                    habits[counter].append('')
-            counter += 1
-    hl = len(habits) + 1  # habits length
-    drl = len(date_range) + 1  # date range length
-    return render_template('view.html', form=form, dr=date_range, h=habits,
-                           hl=hl, drl=drl)
+    return with_etag(make_response(render_report(
+        'view.html', form=form, dr=date_range,
+        rows=view_rows(habits, len(date_range)))), etag)
 
 
 @bp.route('/life', methods=['GET', 'POST'])
@@ -235,45 +297,127 @@ def view():
 def life():
     form = WeekForm()
     if form.validate_on_submit():
-        x = Life.query.filter_by(year=form.year.data).filter_by(
-                week=form.week.data).all()
+        x = Life.query.filter_by(user_id=current_user.id).filter_by(
+            year=form.year.data).filter_by(week=form.week.data).first()
         if x:  # here there needs to be an 'overwrite' warning
-            x[0].content = form.content.data
+            x.content = form.content.data
         else:
             week = Life(year=form.year.data, week=form.week.data,
                         content=form.content.data, user_id=current_user.id)
             db.session.add(week)
+        current_user.bump_data_version()
         db.session.commit()
         flash('Updated Life in Weeks')
         return redirect(url_for('main.life'))
-    try:
-        weeks = Life.query.filter_by(user_id=current_user.id).order_by(
-            Life.year).all()  # this is to find the earliest year
-    except:
-        weeks = []
-    if weeks:
-        fy = weeks[0].year  # first year
-        ly = weeks[-1].year + 1  # last year adjusted for range function
-        life = {}
-        counter1 = fy
-        for year in range(fy, ly):
-            weeks = Life.query.filter_by(user_id=current_user.id).filter_by(
-                    year=year).order_by(Life.week).all()
-            week_nums = [a.week for a in weeks]
-            temp = []
-            counter2 = 0
-            for i in range(0, 52):
-                if i + 1 in week_nums:
-                    temp.append(weeks[counter2])
-                    counter2 += 1
-                else:
-                    temp.append('')
-            if weeks:
-                life[counter1] = temp
-            else:
-                life[counter1] = []
-            counter1 += 1
-        return render_template('life.html', start=fy, end=ly, life=life,
-                               form=form)
+    etag = report_etag()
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    grid = report_cache.fetch('life', current_user, (),
+                              lambda: life_grid(current_user.id))
+    if grid:
+        page = render_report('life.html', rows=life_rows(grid[2]), form=form)
     else:
-        return render_template('life.html', form=form)
+        page = render_report('life.html', form=form)
+    return with_etag(make_response(page), etag)
+
+
+def heatmaps(habits, year):
+    # [SVG heatmap of each habit in year], cached one per habit, the ones
+    # missing from the cache are rendered together
+    def compute(missing):
+        svgs = habit_heatmaps([params[1] for params in missing], year)
+        return {params: svgs[params[1]] for params in missing}
+    return report_cache.fetch_many(
+        'heatmap', current_user, [(year, habit.id) for habit in habits],
+        compute)
+
+
+def check_year(year):
+    # a year whose grid, which starts on the Sunday before it, is all dates
+    if not date.min.year < year < date.max.year:
+        abort(404)
+
+
+def svg_response(svg, etag):
+    return with_etag(Response(svg, mimetype='image/svg+xml'), etag)
+
+
+@bp.route('/heatmap', methods=['GET'])
+@login_required
+def heatmap():
+    # a year of all the habits together and of each one
+    year = request.args.get('year', date.today().year, type=int)
+    check_year(year)
+    etag = report_etag(year)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    habits = year_habits(current_user.id, year)
+    ids = [habit.id for habit in habits]
+    combined = report_cache.fetch('heatmap', current_user, (year, None),
+                                  lambda: combined_heatmap(ids, year))
+    return with_etag(make_response(render_template(
+        'heatmap.html', title='Heatmap', year=year, combined=combined,
+        habits=zip(habits, heatmaps(habits, year)))), etag)
+
+
+@bp.route('/heatmap/<int:year>.svg', methods=['GET'])
+@login_required
+def combined_heatmap_svg(year):
+    check_year(year)
+    etag = report_etag(year)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    svg = report_cache.fetch(
+        'heatmap', current_user, (year, None), lambda: combined_heatmap(
+            [habit.id for habit in year_habits(current_user.id, year)],
+            year))
+    return svg_response(svg, etag)
+
+
+@bp.route('/heatmap/<int:year>/<int:habit_id>.svg', methods=['GET'])
+@login_required
+def habit_heatmap_svg(year, habit_id):
+    check_year(year)
+    habit = Habit.query.filter_by(id=habit_id,
+                                  user_id=current_user.id).first_or_404()
+    etag = report_etag(year, habit_id)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    return svg_response(heatmaps([habit], year)[0], etag)
+
+
+@bp.route('/export')
+@login_required
+def export_data():
+    return render_template('export.html', title='Export',
+                           tables=export.TABLES, formats=export.FORMATS)
+
+
+@bp.route('/export/<any(habit, completed, book, life):table>.'
+          '<any(csv, ndjson):fmt>')
+@login_required
+def export_table(table, fmt):
+    filename = '{}.{}'.format(table, fmt)
+    return Response(
+        stream_with_context(export.generate(current_user.id, table, fmt)),
+        mimetype=export.MIMETYPES[fmt],
+        headers={'Content-Disposition': 'attachment; filename=' + filename})
+
+
+@bp.route('/import', methods=['GET', 'POST'])
+@login_required
+def import_data():
+    form = ImportForm()
+    if form.validate_on_submit():
+        result = import_completions(current_user.id, form.file.data.stream,
+                                    form.format.data)
+        flash('Imported {rows} completions in {seconds:.1f}s '
+              '({rows_per_second:.0f}/s), skipped {skipped} invalid and '
+              '{duplicates} already recorded rows, created {habits_created} '
+              'habits'.format(**result))
+        return redirect(url_for('main.index'))
+    return render_template('import.html', title='Import', form=form)
@@ -0,0 +1,106 @@
+from sqlalchemy import and_, exists, func, or_
+from app import db
+from app.models import User, Habit, Completed, Life, HabitTotal, \
+    HabitStreak, HabitYear
+from app.storage import get_store
+
+# Clean up jobs for `flask maintenance`, safe to run on the live database:
+# each one walks a table in ranges of CHUNK keys and commits every range
+# on its own, so no lock is held for longer than a range takes. They are
+# generators yielding (last key of the range, rows changed) as they go.
+
+CHUNK = 10000
+
+# rows whose parent is gone: (model, key walked, column pointing to the
+# parent, parent's key)
+ORPHANS = [
+    (Completed, Completed.id, Completed.habit_id, Habit.id),
+    (Life, Life.id, Life.user_id, User.id),
+    (HabitTotal, HabitTotal.habit_id, HabitTotal.habit_id, Habit.id),
+    (HabitStreak, HabitStreak.habit_id, HabitStreak.habit_id, Habit.id),
+    (HabitYear, HabitYear.habit_id, HabitYear.habit_id, Habit.id),
+]
+
+
+def key_ranges(key, chunk=CHUNK):
+    # [(first, last)] covering every value of the integer column key
+    low, high = db.session.query(func.min(key), func.max(key)).one()
+    db.session.commit()
+    if low is None:
+        return []
+    return [(first, min(first + chunk - 1, high))
+            for first in range(low, high + 1, chunk)]
+
+
+def bump_users(habit_ids):
+    # drops the cached reports of the owners of habit_ids
+    if habit_ids:
+        owners = db.session.query(Habit.user_id).filter(
+            Habit.id.in_(habit_ids))
+        User.query.filter(User.id.in_(owners.subquery())).update(
+            {User.data_version: User.data_version + 1},
+            synchronize_session=False)
+
+
+def dedupe_completed(ranges):
+    # keeps the first of the completed rows of a habit on the same day,
+    # walking habit ids so each group is found through the unique index
+    store = get_store()
+    for first, last in ranges:
+        groups = db.session.query(
+            Completed.habit_id, Completed.date, func.min(Completed.id)) \
+            .filter(Completed.habit_id.between(first, last)).group_by(
+            Completed.habit_id, Completed.date).having(func.count() > 1).all()
+        deleted = 0
+        if groups:
+            deleted = Completed.query.filter(or_(*[
+                and_(Completed.habit_id == habit_id, Completed.date == day,
+                     Completed.id != keep)
+                for habit_id, day, keep in groups])).delete(
+                synchronize_session=False)
+            habit_ids = {habit_id for habit_id, day, keep in groups}
+            store.refresh(habit_ids)
+            bump_users(habit_ids)
+        db.session.commit()
+        yield last, deleted
+
+
+def purge_orphans(model, key, column, parent, ranges):
+    for first, last in ranges:
+        deleted = model.query.filter(key.between(first, last)).filter(
+            or_(column.is_(None), ~exists().where(parent == column))) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+        yield last, deleted
+
+
+def backfill(ranges):
+    # rebuilds what the store derives from its completions (the totals and
+    # the streaks) for habit ids a range at a time
+    store = get_store()
+    for first, last in ranges:
+        habit_ids = [id for id, in db.session.query(Habit.id).filter(
+            Habit.id.between(first, last))]
+        store.refresh(habit_ids)
+        bump_users(habit_ids)
+        db.session.commit()
+        yield last, len(habit_ids)
+
+
+def optimize(vacuum=True):
+    # VACUUM and ANALYZE, outside of a transaction as they have to be; on
+    # SQLite a VACUUM holds off writers while it rewrites the file
+    statements = ['ANALYZE']
+    if vacuum:
+        statements.insert(0, 'VACUUM')
+    db.session.remove()
+    connection = db.engine.connect()
+    try:
+        if db.engine.name == 'postgresql':
+            connection = connection.execution_options(
+                isolation_level='AUTOCOMMIT')
+        for statement in statements:
+            connection.execute(statement)
+    finally:
+        connection.close()
+    return statements
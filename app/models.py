@@ -1,15 +1,47 @@
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import date
-from app import db, login
+from datetime import date, datetime, timedelta
+import base64
+import os
+from app import db, login, user_cache
 from flask_login import UserMixin
 from time import time
 import jwt
 from flask import current_app
+from sqlalchemy.orm import Session, object_session
 
 
 @login.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    return user_cache.get(int(id), UserSnapshot.load)
+
+
+class UserSnapshot(UserMixin):
+    # what current_user is when served from the identity cache, a detached
+    # copy of the columns the pages use, so cached requests don't touch the
+    # database just to know who is logged in
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+
+    @staticmethod
+    def load(id):
+        user = User.query.get(id)
+        return UserSnapshot(user) if user else None
+
+    @property
+    def data_version(self):
+        return db.session.query(User.data_version).filter_by(
+            id=self.id).scalar()
+
+    def bump_data_version(self):
+        User.query.filter_by(id=self.id).update(
+            {User.data_version: User.data_version + 1},
+            synchronize_session=False)
+
+    def __repr__(self):
+        return '<UserSnapshot: {}>'.format(self.username)
 
 
 class User(UserMixin, db.Model):
@@ -17,6 +49,9 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(64), index=True, unique=True)
     email = db.Column(db.String(120), index=True, unique=True)
     password_hash = db.Column(db.String(128))
+    token = db.Column(db.String(32), index=True, unique=True)
+    token_expiration = db.Column(db.DateTime)
+    data_version = db.Column(db.Integer, default=0, nullable=False)
     habit = db.relationship('Habit', backref='author', lazy='dynamic')
     book = db.relationship('Book', backref='reader', lazy='dynamic')
     life = db.relationship('Life', backref='person', lazy='dynamic')
@@ -49,6 +84,44 @@ class User(UserMixin, db.Model):
             return
         return User.query.get(id)
 
+    def bump_data_version(self):
+        # called by every write to the user's habits, completions, books or
+        # weeks, makes the cached reports of the old version unreachable
+        self.data_version = User.data_version + 1
+
+    def get_token(self, expires_in=3600):
+        now = datetime.utcnow()
+        if self.token and self.token_expiration > now + timedelta(seconds=60):
+            return self.token
+        self.token = base64.b64encode(os.urandom(24)).decode('utf-8')
+        self.token_expiration = now + timedelta(seconds=expires_in)
+        db.session.add(self)
+        return self.token
+
+    def revoke_token(self):
+        self.token_expiration = datetime.utcnow() - timedelta(seconds=1)
+
+    @staticmethod
+    def check_token(token):
+        user = User.query.filter_by(token=token).first()
+        if user is None or user.token_expiration < datetime.utcnow():
+            return None
+        return user
+
+
+@db.event.listens_for(User, 'after_update')
+def user_updated(mapper, connection, target):
+    # password resets and profile changes, forgotten once committed so the
+    # old row can't be cached again in between
+    object_session(target).info.setdefault('updated_users', set()).add(
+        target.id)
+
+
+@db.event.listens_for(Session, 'after_commit')
+def forget_updated_users(session):
+    for id in session.info.pop('updated_users', ()):
+        user_cache.forget(id)
+
 
 class Habit(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -59,8 +132,17 @@ class Habit(db.Model):
     # say x = datetime.utcnow(), so you need x.day
     # notice parenthesis here ^ but none over here ^
     end_date = db.Column(db.Date, default=date(9999, 1, 1))
+    # when it is due, see app/schedules.py
+    schedule = db.Column(db.String(10), default='daily',
+                         server_default='daily', nullable=False)
+    schedule_value = db.Column(db.Integer)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     completed = db.relationship('Completed', backref='habit', lazy='dynamic')
+    # covers both "all of a user's habits" and "a user's habits on a day"
+    __table_args__ = (
+        db.Index('ix_habit_user_id_start_date_end_date', 'user_id',
+                 'start_date', 'end_date'),
+    )
 
 # should I add another field so they can choose the order of habits?
 
@@ -72,29 +154,128 @@ class Completed(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date)
     habit_id = db.Column(db.Integer, db.ForeignKey('habit.id'))
+    # a habit is either completed on a day or not, duplicates would be
+    # double counted by the stats
+    __table_args__ = (
+        db.Index('ix_completed_habit_id_date', 'habit_id', 'date',
+                 unique=True),
+    )
 
     def __repr__(self):
         return '<Completed: id-{}, date-{}>'.format(self.id, self.date)
 
 
+class HabitTotal(db.Model):
+    # rollup of the completed table, kept current by the check-in path
+    # so /stats never has to count a habit's whole history
+    habit_id = db.Column(db.Integer, db.ForeignKey('habit.id'),
+                         primary_key=True)
+    total = db.Column(db.Integer, default=0, nullable=False)
+    last_date = db.Column(db.Date)
+
+    def __repr__(self):
+        return '<HabitTotal: habit-{}, total-{}>'.format(self.habit_id,
+                                                        self.total)
+
+
+class HabitStreak(db.Model):
+    # the latest and the longest run of consecutive days of a habit, kept
+    # current by the check-in path, see app/streaks.py
+    habit_id = db.Column(db.Integer, db.ForeignKey('habit.id'),
+                         primary_key=True)
+    last_start = db.Column(db.Date)
+    last_end = db.Column(db.Date)
+    longest = db.Column(db.Integer, default=0, nullable=False)
+    longest_start = db.Column(db.Date)
+    longest_end = db.Column(db.Date)
+
+    def __repr__(self):
+        return '<HabitStreak: habit-{}, longest-{}>'.format(self.habit_id,
+                                                           self.longest)
+
+
+class HabitYear(db.Model):
+    # a year of a habit's completions as a bitmap, see app/bitmaps.py, used
+    # in place of completed rows when HABIT_STORAGE is 'bitmap'
+    habit_id = db.Column(db.Integer, db.ForeignKey('habit.id'),
+                         primary_key=True)
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    days = db.Column(db.LargeBinary(46), nullable=False)
+
+    def __repr__(self):
+        return '<HabitYear: habit-{}, year-{}>'.format(self.habit_id,
+                                                      self.year)
+
+
 class Book(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(140))
     author = db.Column(db.String(140))
     date = db.Column(db.Date)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    __table_args__ = (
+        # keyset pagination, newest first, see app/main/books.py
+        db.Index('ix_book_user_id_date_id', 'user_id', 'date', 'id'),
+    )
 
     def __repr__(self):
         return '<Id: {}, Title: {}, Author: {}, Date Finished: {}>'.format(
             self.id, self.title, self.author, self.date)
 
 
+# full text search over title and author, an FTS5 table kept up to date by
+# triggers on SQLite and an expression GIN index on Postgres, the same
+# statements as in the book_search migration, these cover create_all()
+BOOK_SEARCH_DDL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5("
+        "title, author, content='book', content_rowid='id')",
+        "CREATE TRIGGER IF NOT EXISTS book_fts_insert AFTER INSERT ON book "
+        "BEGIN INSERT INTO book_fts (rowid, title, author) "
+        "VALUES (new.id, new.title, new.author); END",
+        "CREATE TRIGGER IF NOT EXISTS book_fts_delete AFTER DELETE ON book "
+        "BEGIN INSERT INTO book_fts (book_fts, rowid, title, author) "
+        "VALUES ('delete', old.id, old.title, old.author); END",
+        "CREATE TRIGGER IF NOT EXISTS book_fts_update AFTER UPDATE ON book "
+        "BEGIN INSERT INTO book_fts (book_fts, rowid, title, author) "
+        "VALUES ('delete', old.id, old.title, old.author); "
+        "INSERT INTO book_fts (rowid, title, author) "
+        "VALUES (new.id, new.title, new.author); END",
+    ],
+    'postgresql': [
+        "CREATE INDEX ix_book_search ON book USING gin "
+        "(to_tsvector('simple', coalesce(title, '') || ' ' || "
+        "coalesce(author, '')))",
+    ],
+}
+for dialect, statements in BOOK_SEARCH_DDL.items():
+    for statement in statements:
+        db.event.listen(Book.__table__, 'after_create',
+                        db.DDL(statement).execute_if(dialect=dialect))
+db.event.listen(Book.__table__, 'after_drop', db.DDL(
+    'DROP TABLE IF EXISTS book_fts').execute_if(dialect='sqlite'))
+
+
 class Life(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     year = db.Column(db.Integer)
     week = db.Column(db.Integer)
     content = db.Column(db.String(280))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    __table_args__ = (
+        db.Index('ix_life_user_id_year_week', 'user_id', 'year', 'week'),
+    )
 
     def __repr__(self):
         return '<Year: {}, Week: {}>'.format(self.year, self.week)
+
+
+class StoredSession(db.Model):
+    # server side sessions, see app/sessions.py, only the id is sent in the
+    # cookie
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.LargeBinary)
+    expiry = db.Column(db.DateTime, index=True)
+
+    def __repr__(self):
+        return '<Session expires {}>'.format(self.expiry)
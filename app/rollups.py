@@ -0,0 +1,92 @@
+from sqlalchemy import case, func, or_, select
+from app import db
+from app.models import Habit, Completed, HabitTotal
+
+
+def count_completed(habit_ids, until):
+    # per-habit completion counts up to and including until, in one GROUP BY
+    counts = dict.fromkeys(habit_ids, 0)
+    if not habit_ids:
+        return counts
+    rows = db.session.query(
+        Completed.habit_id, func.count(Completed.id)).filter(
+        Completed.habit_id.in_(habit_ids)).filter(
+        Completed.date <= until).group_by(Completed.habit_id)
+    counts.update(rows)
+    return counts
+
+
+def habit_totals(user_id, until):
+    # returns [(habit, completed)] for all of a user's habits, read from the
+    # rollup table; only habits with completions dated after until (logged
+    # ahead of time) fall back to counting rows
+    rows = db.session.query(Habit, HabitTotal).outerjoin(
+        HabitTotal, HabitTotal.habit_id == Habit.id).filter(
+        Habit.user_id == user_id).order_by(Habit.id).all()
+    ahead = [habit.id for habit, rollup in rows
+             if rollup and rollup.last_date and rollup.last_date > until]
+    counts = count_completed(ahead, until)
+    totals = []
+    for habit, rollup in rows:
+        if habit.id in counts:
+            totals.append((habit, counts[habit.id]))
+        else:
+            totals.append((habit, rollup.total if rollup else 0))
+    return totals
+
+
+def record_completions(day, added, removed):
+    # apply a check-in on day to the rollups, added and removed are habit ids
+    # whose completed rows are in the current session; a few set-based
+    # statements however many habits there are, caller commits
+    added, removed = list(added), list(removed)
+    if not added and not removed:
+        return
+    table = HabitTotal.__table__
+    ids = added + removed
+    existing = {habit_id for habit_id, in db.session.query(
+        HabitTotal.habit_id).filter(HabitTotal.habit_id.in_(ids))}
+    added_rows = [habit_id for habit_id in added if habit_id in existing]
+    removed_rows = [habit_id for habit_id in removed if habit_id in existing]
+    if added_rows:
+        db.session.execute(table.update().where(
+            table.c.habit_id.in_(added_rows)).values(
+            total=table.c.total + 1,
+            last_date=case([(or_(table.c.last_date.is_(None),
+                                 table.c.last_date < day), day)],
+                           else_=table.c.last_date)))
+    if removed_rows:
+        db.session.execute(table.update().where(
+            table.c.habit_id.in_(removed_rows)).values(
+            total=table.c.total - 1))
+        # the last day was the one taken back, look up the one before it
+        last = select([func.max(Completed.date)]).where(
+            Completed.habit_id == table.c.habit_id).as_scalar()
+        db.session.execute(table.update().where(
+            table.c.habit_id.in_(removed_rows)).where(
+            table.c.last_date == day).values(last_date=last))
+    missing = [habit_id for habit_id in ids if habit_id not in existing]
+    if missing:  # counted from scratch, like rebuild_totals
+        db.session.execute(table.insert().from_select(
+            ['habit_id', 'total', 'last_date'],
+            select([Completed.habit_id, func.count(Completed.id),
+                    func.max(Completed.date)]).where(
+                Completed.habit_id.in_(missing)).group_by(
+                Completed.habit_id)))
+
+
+def rebuild_totals(habit_ids=None):
+    # recounts the rollups of the given habits, or of every habit, from the
+    # completed table, caller commits
+    rollups = HabitTotal.query
+    counts = select([Completed.habit_id, func.count(Completed.id),
+                     func.max(Completed.date)]).where(
+        Completed.habit_id.isnot(None)).group_by(Completed.habit_id)
+    if habit_ids is not None:
+        if not habit_ids:
+            return
+        rollups = rollups.filter(HabitTotal.habit_id.in_(habit_ids))
+        counts = counts.where(Completed.habit_id.in_(habit_ids))
+    rollups.delete(synchronize_session=False)
+    db.session.execute(HabitTotal.__table__.insert().from_select(
+        ['habit_id', 'total', 'last_date'], counts))
@@ -0,0 +1,152 @@
+from datetime import timedelta
+
+# How often a habit is due, Habit.schedule with Habit.schedule_value:
+#   'daily'    every day
+#   'weekdays' the days of schedule_value, a mask with bit 0 for Monday
+#   'weekly'   schedule_value times a week (Monday to Sunday), any day
+#   'interval' every schedule_value days counting from start_date
+# is_due() and due_count() work the answer out arithmetically, so a
+# decade of a habit costs the same as a day. done_count() does the same
+# for the completions that count towards due_count(), given as a bitmap.
+# Streaks (app/streaks.py) run over the due days of the habits that have
+# some, has_due_days(), and over calendar days for the others.
+
+DAILY, WEEKDAYS, WEEKLY, INTERVAL = 'daily', 'weekdays', 'weekly', 'interval'
+SCHEDULES = [(DAILY, 'Every day'), (WEEKDAYS, 'On some days of the week'),
+             (WEEKLY, 'A number of times a week'),
+             (INTERVAL, 'Every few days')]
+WEEKDAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+WEEK = (1 << 7) - 1
+
+
+def weekday_mask(weekdays):
+    mask = 0
+    for weekday in weekdays:
+        mask |= 1 << weekday
+    return mask
+
+
+def mask_weekdays(mask):
+    return [weekday for weekday in range(7) if mask >> weekday & 1]
+
+
+def is_due(habit, day):
+    # whether habit is to be done on day
+    if not habit.start_date <= day <= habit.end_date:
+        return False
+    if habit.schedule == WEEKDAYS:
+        return bool(habit.schedule_value >> day.weekday() & 1)
+    if habit.schedule == INTERVAL:
+        return (day - habit.start_date).days % habit.schedule_value == 0
+    return True  # daily, and weekly habits can be done on any day
+
+
+def due_count(habit, a, b):
+    # the number of times habit is to be done from a through b
+    a, b = max(a, habit.start_date), min(b, habit.end_date)
+    if b < a:
+        return 0
+    if habit.schedule == WEEKDAYS:
+        return weekdays_between(a, b, habit.schedule_value)
+    if habit.schedule == WEEKLY:
+        return times_between(a, b, habit.schedule_value)
+    if habit.schedule == INTERVAL:
+        k = habit.schedule_value
+        first = -(-(a - habit.start_date).days // k)  # rounded up
+        last = (b - habit.start_date).days // k
+        return max(last - first + 1, 0)
+    return (b - a).days + 1
+
+
+def weekdays_between(a, b, mask):
+    # the days from a through b that fall on a weekday of mask
+    days = (b - a).days + 1
+    weeks, rest = divmod(days, 7)
+    count = weeks * bin(mask & WEEK).count('1')
+    # the last few days start on a's weekday, the mask is doubled so they
+    # can run past Sunday
+    doubled = (mask & WEEK) | (mask & WEEK) << 7
+    tail = doubled >> a.weekday() & ((1 << rest) - 1)
+    return count + bin(tail).count('1')
+
+
+def times_between(a, b, times):
+    # times a week from a through b, the weeks a and b are cut from count
+    # no more times than they have days
+    monday_a = a - timedelta(a.weekday())
+    monday_b = b - timedelta(b.weekday())
+    if monday_a == monday_b:
+        return min(times, (b - a).days + 1)
+    full_weeks = (monday_b - monday_a).days // 7 - 1
+    return (min(times, 7 - a.weekday()) + full_weeks * times +
+            min(times, b.weekday() + 1))
+
+
+def repeated(period, times):
+    # an int with bit 0 set and then every period bits, times of them
+    return ((1 << period * times) - 1) // ((1 << period) - 1)
+
+
+def has_due_days(habit):
+    # weekly habits can be done on any day, daily ones are due every day
+    return habit.schedule in (WEEKDAYS, INTERVAL)
+
+
+def next_due(habit, day):
+    # the first day after day habit is due on, start and end date aside
+    if habit.schedule == WEEKDAYS:
+        mask = habit.schedule_value & WEEK
+        ahead = (mask | mask << 7) >> day.weekday() + 1
+        return day + timedelta((ahead & -ahead).bit_length())
+    if habit.schedule == INTERVAL:
+        k = habit.schedule_value
+        return day + timedelta(k - (day - habit.start_date).days % k)
+    return day + timedelta(1)
+
+
+def previous_due(habit, day):
+    # the last day before day habit is due on, start and end date aside
+    if habit.schedule == WEEKDAYS:
+        mask = habit.schedule_value & WEEK
+        behind = (mask | mask << 7) & (1 << day.weekday() + 7) - 1
+        return day - timedelta(day.weekday() + 8 - behind.bit_length())
+    if habit.schedule == INTERVAL:
+        k = habit.schedule_value
+        return day - timedelta((day - habit.start_date).days % k or k)
+    return day - timedelta(1)
+
+
+def due_bits(habit, d1, days):
+    # bit i set if habit is due on day d1 + i, for days days, start and end
+    # date aside
+    everything = (1 << days) - 1
+    if habit.schedule == WEEKDAYS:
+        mask = habit.schedule_value & WEEK
+        week = ((mask | mask << 7) >> d1.weekday()) & WEEK
+        return week * repeated(7, -(-days // 7)) & everything
+    if habit.schedule == INTERVAL:
+        k = habit.schedule_value
+        first = -(d1 - habit.start_date).days % k
+        return repeated(k, -(-days // k)) << first & everything
+    return everything
+
+
+def done_count(habit, bits, d1, d2):
+    # how many of the completions in bits (bit i being day d1 + i) count
+    # towards due_count(habit, d1, d2): days that weren't due don't, nor do
+    # more than schedule_value a week
+    days = (d2 - d1).days + 1
+    if days <= 0:
+        return 0
+    bits &= (1 << days) - 1
+    if has_due_days(habit):
+        return bin(bits & due_bits(habit, d1, days)).count('1')
+    if habit.schedule == WEEKLY:
+        count, length = 0, 7 - d1.weekday()  # the first week may be short
+        while bits:
+            count += min(bin(bits & (1 << length) - 1).count('1'),
+                         habit.schedule_value)
+            bits >>= length
+            length = 7
+        return count
+    return bin(bits).count('1')
@@ -0,0 +1,113 @@
+import random
+import secrets
+from datetime import datetime
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from app import db
+from app.models import StoredSession
+
+# With SESSION_STORE = 'database' the session lives in the stored_session
+# table and the cookie only carries its id, so it stays the same size
+# however much the session holds and every tab sees the same state. The
+# rows are read and written on their own connection, outside of db.session
+# and whatever the view left in it. The id changes whenever the user
+# logged in to it does, so an id planted before a login is useless after
+# it.
+
+table = StoredSession.__table__
+
+
+def login_id(session):
+    # Flask-Login's user id key, it gained an underscore in 0.5
+    return session.get('_user_id', session.get('user_id'))
+
+
+class ServerSession(CallbackDict, SessionMixin):
+
+    def __init__(self, initial=None, sid=None, new=False, expiry=None):
+        def on_update(self):
+            self.modified = True
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expiry = expiry
+        self.modified = False
+        self.opened_by = login_id(self)
+
+
+class DatabaseSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, sweep_probability=0.01):
+        self.sweep_probability = sweep_probability
+
+    def open_session(self, app, request):
+        # by path, the url isn't always matched yet when the session opens
+        if request.path.startswith((app.static_url_path or '/static') + '/'):
+            return ServerSession()  # static files, never looked up nor saved
+        sid = request.cookies.get(app.session_cookie_name)
+        if sid:
+            with db.engine.connect() as conn:
+                row = conn.execute(
+                    table.select().where(table.c.id == sid)).first()
+            if row is not None and row.expiry > datetime.utcnow():
+                try:
+                    data = self.serializer.loads(row.data.decode('utf-8'))
+                    return ServerSession(data, sid=sid, expiry=row.expiry)
+                except ValueError:
+                    pass
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        if session.sid is None:
+            return
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        old_sid = None
+        if not session.new and login_id(session) != session.opened_by:
+            # logged in or out, the session goes on under a new id
+            old_sid, session.sid = session.sid, secrets.token_urlsafe(32)
+            session.new = session.modified = True
+        if not session:
+            if session.modified:
+                with db.engine.begin() as conn:
+                    conn.execute(table.delete().where(
+                        table.c.id.in_([session.sid, old_sid])))
+                response.delete_cookie(app.session_cookie_name,
+                                       domain=domain, path=path)
+            return
+        now = datetime.utcnow()
+        lifetime = app.permanent_session_lifetime
+        # unchanged sessions are only written again once half of their
+        # lifetime has gone, not on every request
+        stale = session.expiry is None or session.expiry - now < lifetime / 2
+        if not session.modified and not stale:
+            return
+        expiry = now + lifetime
+        values = {'data': self.serializer.dumps(dict(session)).encode('utf-8'),
+                  'expiry': expiry}
+        with db.engine.begin() as conn:
+            if old_sid:
+                conn.execute(table.delete().where(table.c.id == old_sid))
+            if session.new or not conn.execute(table.update().where(
+                    table.c.id == session.sid).values(**values)).rowcount:
+                conn.execute(table.insert().values(id=session.sid, **values))
+            if random.random() < self.sweep_probability:
+                sweep(conn, now)
+        response.set_cookie(
+            app.session_cookie_name, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app))
+
+
+def sweep(conn=None, now=None):
+    # deletes the expired sessions, returns how many
+    now = now or datetime.utcnow()
+    statement = table.delete().where(table.c.expiry <= now)
+    if conn is not None:
+        return conn.execute(statement).rowcount
+    with db.engine.begin() as conn:
+        return conn.execute(statement).rowcount
@@ -0,0 +1,94 @@
+import re
+import time
+from collections import Counter
+from flask import current_app, g, request, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Counts the SQL statements each request runs and the time spent in them.
+# A request running the same statement shape (the SQL with its parameters
+# and IN lists folded) more than SQL_STATS_REPEAT_LIMIT times is logged as a
+# warning, that is what an N+1 looks like. Statements run while a streamed
+# response is being sent come after after_request and aren't counted.
+
+_space = re.compile(r'\s+')
+_params = re.compile(r'(\?|%\(\w+\)s|%s)(\s*,\s*(\?|%\(\w+\)s|%s))*')
+
+
+def shape(statement):
+    return _params.sub('?', _space.sub(' ', statement)).strip()
+
+
+class RequestStats(object):
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+
+class QueryStats(object):
+
+    def __init__(self, app=None):
+        self.listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config['SQL_STATS']:
+            return
+        if not self.listening:
+            # every engine, the statements are only counted when they run
+            # inside a request of an app that has this turned on
+            event.listen(Engine, 'before_cursor_execute', self.before_execute)
+            event.listen(Engine, 'after_cursor_execute', self.after_execute)
+            self.listening = True
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    def before_request(self):
+        g.sql_stats = RequestStats()
+
+    def before_execute(self, conn, cursor, statement, parameters, context,
+                       executemany):
+        if has_app_context() and g.get('sql_stats') is not None:
+            conn.info.setdefault('sql_stats_start', []).append(
+                time.perf_counter())
+
+    def after_execute(self, conn, cursor, statement, parameters, context,
+                      executemany):
+        if not has_app_context():
+            return
+        stats = g.get('sql_stats')
+        starts = conn.info.get('sql_stats_start')
+        if stats is None or not starts:
+            return
+        stats.seconds += time.perf_counter() - starts.pop()
+        stats.queries += 1
+        stats.shapes[shape(statement)] += 1
+
+    def after_request(self, response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+        config = current_app.config
+        total = time.perf_counter() - stats.start
+        if config['SQL_STATS_LOG']:
+            current_app.logger.info(
+                '%s %s %s: %d queries, %.1f ms in db, %.1f ms total',
+                request.method, request.path, response.status_code,
+                stats.queries, stats.seconds * 1000, total * 1000)
+        limit = config['SQL_STATS_REPEAT_LIMIT']
+        for statement, count in stats.shapes.most_common():
+            if count <= limit:
+                break
+            current_app.logger.warning(
+                '%s %s ran the same statement %d times: %s',
+                request.method, request.path, count, statement[:300])
+        if config['SERVER_TIMING']:
+            response.headers.add(
+                'Server-Timing', 'db;desc="{} queries";dur={:.1f}, '
+                'app;dur={:.1f}'.format(stats.queries, stats.seconds * 1000,
+                                        total * 1000))
+        return response
@@ -0,0 +1,49 @@
+import os
+import time
+from contextlib import contextmanager
+import click
+from jinja2 import FileSystemBytecodeCache
+
+# Helpers for create_app(): timing of the init steps (logged with
+# STARTUP_PROFILE set), the Jinja bytecode cache and the template pre-warm.
+# Under gunicorn --preload the pre-warm runs once in the master and the
+# workers are forked with the templates already compiled.
+
+
+class StartupProfile(object):
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.steps = []
+
+    @contextmanager
+    def __call__(self, name):
+        start = time.perf_counter()
+        yield
+        self.steps.append((name, time.perf_counter() - start))
+
+    def report(self, logger):
+        total = time.perf_counter() - self.start
+        for name, seconds in self.steps:
+            logger.info('startup: %-20s %8.1f ms', name, seconds * 1000)
+        logger.info('startup: %-20s %8.1f ms', 'create_app', total * 1000)
+
+
+def in_cli():
+    # True when the app is loaded by the flask command, not by a server
+    return click.get_current_context(silent=True) is not None
+
+
+def bytecode_cache(directory):
+    if not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    return FileSystemBytecodeCache(directory)
+
+
+def prewarm_templates(app):
+    # compiles every template, returns how many
+    env = app.jinja_env
+    names = [name for name in env.list_templates() if name.endswith('.html')]
+    for name in names:
+        env.get_template(name)
+    return len(names)
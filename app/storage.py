@@ -0,0 +1,375 @@
+import sqlite3
+from datetime import date, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_, cast, func, Integer
+from app import db
+from app.bitmaps import from_bytes, to_bytes, day_bit, days_of, popcount, \
+    year_mask, window, runs
+from app.models import Habit, Completed, HabitYear
+from app.rollups import habit_totals, record_completions, rebuild_totals
+from app.streaks import record_streaks, rebuild_streaks
+
+# index(), stats() and view() read and write completions through one of the
+# stores below, picked by the HABIT_STORAGE setting. Both answer the same
+# questions:
+#   completed_on(day, habit_ids) -> set of the habit ids done on day
+#   apply(day, added, removed)   -> mark/unmark habit ids on day, no commit
+#   bitmaps(habit_ids, d1, d2)   -> {habit_id: int}, bit i is day d1 + i
+#   day_counts(habit_ids, d1, d2) -> [number of the habits done on d1 + i]
+#   totals(user_id, until)       -> [(habit, completed up to until)]
+#   iter_completed(user_id)      -> (habit_id, day) pairs, streamed in order
+#   bulk_add(pairs)              -> mark (habit_id, day) pairs, duplicates
+#                                   are ignored, returns how many were
+#                                   new, no commit
+#   bulk_remove(pairs)           -> unmark (habit_id, day) pairs, no commit
+#   refresh(habit_ids)           -> bring derived data up to date after
+#                                   bulk_add, no commit
+#   runs(habit_ids, until)       -> (habit_id, first day, last day) of each
+#                                   run of consecutive days up to until (or
+#                                   all of them), in order
+
+
+def insert_ignore(table):
+    # an INSERT that skips rows violating a unique constraint
+    if db.engine.name == 'sqlite':
+        return table.insert().prefix_with('OR IGNORE')
+    if db.engine.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(table).on_conflict_do_nothing()
+    return table.insert()
+
+
+def has_window_functions():
+    if db.engine.name == 'postgresql':
+        return True
+    return db.engine.name == 'sqlite' and sqlite3.sqlite_version_info >= \
+        (3, 25)
+
+
+class RowStore(object):
+    # one completed row per habit per day, with the habit_total rollups
+
+    def completed_on(self, day, habit_ids):
+        if not habit_ids:
+            return set()
+        rows = db.session.query(Completed.habit_id).filter(
+            Completed.date == day).filter(Completed.habit_id.in_(habit_ids))
+        return {habit_id for habit_id, in rows}
+
+    def apply(self, day, added, removed):
+        # added and removed were worked out from an earlier completed_on(),
+        # another request may have checked the same habits in since; the
+        # rows are looked up again so the rollups only count the changes
+        # made here, and the insert skips whatever slips in meanwhile
+        existing = self.completed_on(day, set(added) | set(removed))
+        added, removed = set(added) - existing, set(removed) & existing
+        if added:
+            db.session.execute(insert_ignore(Completed.__table__), [
+                {'date': day, 'habit_id': id} for id in added])
+        if removed:
+            Completed.query.filter(Completed.date == day).filter(
+                Completed.habit_id.in_(removed)).delete(
+                synchronize_session=False)
+        record_completions(day, added, removed)
+        record_streaks(self, day, added, removed)
+
+    def bitmaps(self, habit_ids, d1, d2):
+        bitmaps = dict.fromkeys(habit_ids, 0)
+        if not habit_ids:
+            return bitmaps
+        rows = db.session.query(Completed.habit_id, Completed.date).filter(
+            Completed.habit_id.in_(habit_ids)).filter(
+            Completed.date.between(d1, d2))
+        for habit_id, day in rows:
+            bitmaps[habit_id] |= 1 << (day - d1).days
+        return bitmaps
+
+    def day_counts(self, habit_ids, d1, d2):
+        counts = [0] * ((d2 - d1).days + 1)
+        if not habit_ids:
+            return counts
+        rows = db.session.query(Completed.date, func.count()).filter(
+            Completed.habit_id.in_(habit_ids)).filter(
+            Completed.date.between(d1, d2)).group_by(Completed.date)
+        for day, count in rows:
+            counts[(day - d1).days] = count
+        return counts
+
+    def totals(self, user_id, until):
+        return habit_totals(user_id, until)
+
+    def iter_completed(self, user_id, batch=10000):
+        return db.session.query(Completed.habit_id, Completed.date).join(
+            Habit, Habit.id == Completed.habit_id).filter(
+            Habit.user_id == user_id).order_by(
+            Completed.habit_id, Completed.date).yield_per(batch)
+
+    def bulk_add(self, pairs):
+        # the rows already there are looked up first, the drivers' row
+        # counts of an executemany can't be relied on
+        pairs = set(pairs)
+        if not pairs:
+            return 0
+        days = [day for habit_id, day in pairs]
+        pairs -= set(db.session.query(Completed.habit_id, Completed.date)
+                     .filter(Completed.habit_id.in_(
+                         {habit_id for habit_id, day in pairs}))
+                     .filter(Completed.date.between(min(days), max(days))))
+        if pairs:
+            db.session.execute(insert_ignore(Completed.__table__), [
+                {'habit_id': habit_id, 'date': day}
+                for habit_id, day in pairs])
+        return len(pairs)
+
+    def bulk_remove(self, pairs):
+        days = {}
+        for habit_id, day in pairs:
+            days.setdefault(day, set()).add(habit_id)
+        if not days:
+            return
+        Completed.query.filter(or_(*[
+            and_(Completed.date == day, Completed.habit_id.in_(ids))
+            for day, ids in days.items()])).delete(synchronize_session=False)
+
+    def refresh(self, habit_ids):
+        rebuild_totals(list(habit_ids))
+        rebuild_streaks(self, habit_ids)
+
+    def runs(self, habit_ids, until=None):
+        if not habit_ids:
+            return []
+        if not has_window_functions():
+            return self.scan_runs(habit_ids, until)
+        # gaps and islands: the day minus its row number is the same for
+        # every day of a run
+        number = func.row_number().over(partition_by=Completed.habit_id,
+                                        order_by=Completed.date)
+        if db.engine.name == 'sqlite':
+            island = func.julianday(Completed.date) - number
+        else:
+            island = Completed.date - cast(number, Integer)
+        days = db.session.query(
+            Completed.habit_id, Completed.date, island.label('island')) \
+            .filter(Completed.habit_id.in_(habit_ids))
+        if until is not None:
+            days = days.filter(Completed.date <= until)
+        days = days.subquery()
+        first = func.min(days.c.date)
+        return db.session.query(days.c.habit_id, first,
+                                func.max(days.c.date)).group_by(
+            days.c.habit_id, days.c.island).order_by(days.c.habit_id, first)
+
+    def scan_runs(self, habit_ids, until=None):
+        # one ordered pass, for databases without window functions
+        rows = db.session.query(Completed.habit_id, Completed.date).filter(
+            Completed.habit_id.in_(habit_ids))
+        if until is not None:
+            rows = rows.filter(Completed.date <= until)
+        rows = rows.order_by(Completed.habit_id, Completed.date).yield_per(
+            10000)
+        run = None
+        for habit_id, day in rows:
+            if run and run[0] == habit_id and run[2] + timedelta(1) == day:
+                run[2] = day
+                continue
+            if run:
+                yield tuple(run)
+            run = [habit_id, day, day]
+        if run:
+            yield tuple(run)
+
+
+class BitmapStore(object):
+    # one habit_year row per habit per year, totals are popcounts and
+    # ranges are masks over the year's bits
+
+    def years(self, habit_ids, first, last, for_update=False):
+        query = HabitYear.query.filter(HabitYear.habit_id.in_(habit_ids)) \
+            .filter(HabitYear.year.between(first, last))
+        if for_update:
+            query = query.with_for_update()
+        return query
+
+    def completed_on(self, day, habit_ids):
+        if not habit_ids:
+            return set()
+        bit = 1 << day_bit(day)
+        return {row.habit_id for row in
+                self.years(habit_ids, day.year, day.year)
+                if from_bytes(row.days) & bit}
+
+    def apply(self, day, added, removed):
+        ids = set(added) | set(removed)
+        if not ids:
+            return
+        rows = {row.habit_id: row for row in
+                self.years(ids, day.year, day.year, for_update=True)}
+        bit = 1 << day_bit(day)
+        for habit_id in ids:
+            row = rows.get(habit_id)
+            if row is None:
+                if habit_id not in added:
+                    continue
+                row = HabitYear(habit_id=habit_id, year=day.year)
+                db.session.add(row)
+            if habit_id in added:
+                row.days = to_bytes(from_bytes(row.days) | bit)
+            else:
+                row.days = to_bytes(from_bytes(row.days) & ~bit)
+        record_streaks(self, day, added, removed)
+
+    def bitmaps(self, habit_ids, d1, d2):
+        years = {habit_id: {} for habit_id in habit_ids}
+        if not habit_ids:
+            return {}
+        for row in self.years(habit_ids, d1.year, d2.year):
+            years[row.habit_id][row.year] = from_bytes(row.days)
+        return {habit_id: window(years[habit_id], d1, d2)
+                for habit_id in habit_ids}
+
+    def day_counts(self, habit_ids, d1, d2):
+        counts = [0] * ((d2 - d1).days + 1)
+        for bits in self.bitmaps(habit_ids, d1, d2).values():
+            while bits:
+                low = bits & -bits
+                bits ^= low
+                counts[low.bit_length() - 1] += 1
+        return counts
+
+    def totals(self, user_id, until):
+        rows = db.session.query(Habit, HabitYear.year, HabitYear.days) \
+            .outerjoin(HabitYear, and_(HabitYear.habit_id == Habit.id,
+                                       HabitYear.year <= until.year)) \
+            .filter(Habit.user_id == user_id).order_by(Habit.id)
+        last_mask = year_mask(until.year, date.min, until)
+        totals = []
+        for habit, year, days in rows:
+            if not totals or totals[-1][0] is not habit:
+                totals.append([habit, 0])
+            if year == until.year:
+                totals[-1][1] += popcount(from_bytes(days) & last_mask)
+            elif year is not None:
+                totals[-1][1] += popcount(from_bytes(days))
+        return [tuple(total) for total in totals]
+
+    def iter_completed(self, user_id, batch=1000):
+        rows = db.session.query(
+            HabitYear.habit_id, HabitYear.year, HabitYear.days).join(
+            Habit, Habit.id == HabitYear.habit_id).filter(
+            Habit.user_id == user_id).order_by(
+            HabitYear.habit_id, HabitYear.year).yield_per(batch)
+        for habit_id, year, days in rows:
+            for day in days_of(year, from_bytes(days)):
+                yield habit_id, day
+
+    def masks(self, pairs):
+        # {(habit_id, year): bits} of (habit_id, day) pairs, and the rows
+        # already stored for them, locked for the update
+        years = {}
+        for habit_id, day in pairs:
+            key = habit_id, day.year
+            years[key] = years.get(key, 0) | 1 << day_bit(day)
+        if not years:
+            return years, []
+        rows = HabitYear.query.filter(
+            HabitYear.habit_id.in_({key[0] for key in years})).filter(
+            HabitYear.year.in_({key[1] for key in years})).with_for_update()
+        return years, rows
+
+    def bulk_add(self, pairs):
+        years, rows = self.masks(pairs)
+        added = 0
+        for row in rows:
+            bits = years.pop((row.habit_id, row.year), None)
+            if bits:
+                old = from_bytes(row.days)
+                added += popcount(bits & ~old)
+                row.days = to_bytes(old | bits)
+        if years:
+            added += sum(popcount(bits) for bits in years.values())
+            db.session.execute(HabitYear.__table__.insert(), [
+                {'habit_id': habit_id, 'year': year, 'days': to_bytes(bits)}
+                for (habit_id, year), bits in years.items()])
+        return added
+
+    def bulk_remove(self, pairs):
+        years, rows = self.masks(pairs)
+        for row in rows:
+            bits = years.get((row.habit_id, row.year))
+            if bits:
+                row.days = to_bytes(from_bytes(row.days) & ~bits)
+
+    def refresh(self, habit_ids):
+        rebuild_streaks(self, habit_ids)
+
+    def runs(self, habit_ids, until=None):
+        # each habit's years are joined into one int from its first year,
+        # then runs() finds the runs with a few shifts and masks
+        if not habit_ids:
+            return
+        rows = db.session.query(
+            HabitYear.habit_id, HabitYear.year, HabitYear.days).filter(
+            HabitYear.habit_id.in_(habit_ids))
+        if until is not None:
+            rows = rows.filter(HabitYear.year <= until.year)
+        years = {}
+        for habit_id, year, days in rows:
+            years.setdefault(habit_id, {})[year] = from_bytes(days)
+        for habit_id in sorted(years):
+            first = date(min(years[habit_id]), 1, 1)
+            last = date(max(years[habit_id]), 12, 31)
+            if until is not None:
+                last = min(last, until)
+            bits = window(years[habit_id], first, last)
+            for start, end in runs(bits):
+                yield (habit_id, first + timedelta(start),
+                       first + timedelta(end))
+
+
+stores = {'rows': RowStore(), 'bitmap': BitmapStore()}
+
+
+def get_store():
+    return stores[current_app.config['HABIT_STORAGE']]
+
+
+def rows_to_bitmaps(batch=1000):
+    # rebuilds habit_year from the completed table
+    HabitYear.query.delete()
+    rows = db.session.query(Completed.habit_id, Completed.date).filter(
+        Completed.habit_id.isnot(None)).order_by(
+        Completed.habit_id, Completed.date).yield_per(10000)
+    pending, key, bits = [], None, 0
+    for habit_id, day in rows:
+        if (habit_id, day.year) != key:
+            if key:
+                pending.append({'habit_id': key[0], 'year': key[1],
+                                'days': to_bytes(bits)})
+            key, bits = (habit_id, day.year), 0
+            if len(pending) >= batch:
+                db.session.execute(HabitYear.__table__.insert(), pending)
+                pending = []
+        bits |= 1 << day_bit(day)
+    if key:
+        pending.append({'habit_id': key[0], 'year': key[1],
+                        'days': to_bytes(bits)})
+    if pending:
+        db.session.execute(HabitYear.__table__.insert(), pending)
+    db.session.commit()
+
+
+def bitmaps_to_rows(batch=10000):
+    # rebuilds the completed table, and its rollups, from habit_year
+    Completed.query.delete()
+    pending = []
+    for row in HabitYear.query.order_by(HabitYear.habit_id,
+                                        HabitYear.year).yield_per(1000):
+        pending.extend({'habit_id': row.habit_id, 'date': day}
+                       for day in days_of(row.year, from_bytes(row.days)))
+        if len(pending) >= batch:
+            db.session.execute(Completed.__table__.insert(), pending)
+            pending = []
+    if pending:
+        db.session.execute(Completed.__table__.insert(), pending)
+    rebuild_totals()
+    db.session.commit()
@@ -0,0 +1,205 @@
+from datetime import timedelta
+from sqlalchemy import bindparam
+from app import db
+from app.bitmaps import range_mask, runs
+from app.models import Habit, HabitStreak
+from app.schedules import has_due_days, is_due, next_due, previous_due, \
+    due_bits, due_count
+
+# Streaks are kept per habit in habit_streak as the latest run of
+# consecutive days and the longest one (the most recent of equally long
+# runs). Checking a habit in on the day after its latest run, on a later
+# day, or taking back the last day of the latest run is an O(1) update;
+# anything else, like filling in an older day, rescans that habit's runs
+# from the store. Habits without a row yet get one the first time they are
+# read, or all at once with `flask maintenance backfill`.
+# For habits due on some days only (see app/schedules.py) a run is of
+# consecutive due days: the days in between neither break it nor count,
+# and neither do completions on them.
+
+table = HabitStreak.__table__
+COLUMNS = ['last_start', 'last_end', 'longest', 'longest_start',
+           'longest_end']
+# what the streaks need to know of a habit, read as plain values so they
+# outlive a commit
+SCHEDULE = [Habit.id, Habit.schedule, Habit.schedule_value, Habit.start_date,
+            Habit.end_date]
+
+
+def habit_schedules(*criteria):
+    # {habit_id: schedule row} of the habits matching criteria
+    return {row.id: row for row in
+            db.session.query(*SCHEDULE).filter(*criteria)}
+
+
+def run_length(habit, first, last):
+    # days habit was due on from first through last, habit is None for a
+    # habit that is gone
+    if habit is not None and has_due_days(habit):
+        return due_count(habit, first, last)
+    return (last - first).days + 1
+
+
+def due_runs(habit, bits, end):
+    # (first day, last day) of the runs of due days done, bit i of bits
+    # being start_date + i; the days habit isn't due on are filled in so a
+    # run carries on over them, then trimmed off its ends
+    days = min(bits.bit_length(), (end - habit.start_date).days + 1)
+    if days <= 0:
+        return
+    due = due_bits(habit, habit.start_date, days)
+    done = bits & due
+    for start, stop in runs(done | ~due & range_mask(0, days - 1)):
+        run = done & range_mask(start, stop)
+        if run:
+            yield (habit.start_date + timedelta((run & -run).bit_length() - 1),
+                   habit.start_date + timedelta(run.bit_length() - 1))
+
+
+def habit_runs(store, habits, until=None):
+    # (habit_id, first day, last day) runs of habits, {habit_id: schedule
+    # row or None}, in order of day for each habit; the habits with due
+    # days are read as bitmaps from the earliest start on
+    scheduled = [habit for habit in habits.values()
+                 if habit is not None and has_due_days(habit)]
+    others = [habit_id for habit_id, habit in habits.items()
+              if habit is None or not has_due_days(habit)]
+    if others:
+        for run in store.runs(others, until):
+            yield run
+    if scheduled:
+        d1 = min(habit.start_date for habit in scheduled)
+        d2 = until or max(habit.end_date for habit in scheduled)
+        bitmaps = store.bitmaps([habit.id for habit in scheduled], d1, d2)
+        for habit in scheduled:
+            bits = bitmaps[habit.id] >> (habit.start_date - d1).days
+            for first, last in due_runs(habit, bits,
+                                        min(d2, habit.end_date)):
+                yield habit.id, first, last
+
+
+def summarize(runs, habits):
+    # {habit_id: row values} from (habit_id, first day, last day) runs
+    # ordered by day for each habit
+    streaks = {habit_id: {'habit_id': habit_id, 'last_start': None,
+                          'last_end': None, 'longest': 0,
+                          'longest_start': None, 'longest_end': None}
+               for habit_id in habits}
+    for habit_id, first, last in runs:
+        streak = streaks[habit_id]
+        streak['last_start'], streak['last_end'] = first, last
+        length = run_length(habits[habit_id], first, last)
+        if length >= streak['longest']:
+            streak['longest'] = length
+            streak['longest_start'], streak['longest_end'] = first, last
+    return streaks
+
+
+def rebuild_streaks(store, habit_ids):
+    # recomputes the rows of the given habits from the store, no commit
+    habit_ids = list(habit_ids)
+    if not habit_ids:
+        return
+    habits = dict.fromkeys(habit_ids)
+    habits.update(habit_schedules(Habit.id.in_(habit_ids)))
+    streaks = summarize(habit_runs(store, habits), habits)
+    HabitStreak.query.filter(HabitStreak.habit_id.in_(habit_ids)).delete(
+        synchronize_session=False)
+    db.session.execute(HabitStreak.__table__.insert(),
+                       list(streaks.values()))
+
+
+def record_streaks(store, day, added, removed):
+    # applies a check-in on day, after the store has applied it; the new
+    # values are worked out here and written with one executemany UPDATE,
+    # no commit
+    ids = set(added) | set(removed)
+    if not ids:
+        return
+    rows = db.session.query(*(list(table.c) + SCHEDULE[1:])).outerjoin(
+        Habit, Habit.id == table.c.habit_id).filter(
+        table.c.habit_id.in_(ids)).with_for_update(of=table)
+    rows = {row.habit_id: row for row in rows}
+    changed, rescan = [], []
+    for habit_id in ids:
+        habit = rows.get(habit_id)  # the streak and the schedule
+        if habit is None:
+            rescan.append(habit_id)
+            continue
+        if has_due_days(habit) and not is_due(habit, day):
+            continue  # not part of any run
+        streak = {column: getattr(habit, column) for column in COLUMNS}
+        if habit_id in added:
+            after = streak['last_end'] and next_due(habit, streak['last_end'])
+            if after is None or day > after:
+                streak['last_start'] = streak['last_end'] = day  # a new run
+            elif day == after:
+                streak['last_end'] = day
+            else:  # an older day, might join two runs
+                rescan.append(habit_id)
+                continue
+            length = run_length(habit, streak['last_start'],
+                                streak['last_end'])
+            if length >= streak['longest']:
+                streak['longest'] = length
+                streak['longest_start'] = streak['last_start']
+                streak['longest_end'] = streak['last_end']
+            changed.append(dict(streak, id=habit_id))
+        elif (day == streak['last_end'] and day != streak['last_start'] and
+                day != streak['longest_end']):
+            streak['last_end'] = previous_due(habit, day)
+            changed.append(dict(streak, id=habit_id))
+        else:  # splits or ends a run whose neighbours aren't known
+            rescan.append(habit_id)
+    if changed:
+        db.session.execute(table.update().where(
+            table.c.habit_id == bindparam('id')).values(
+            {column: bindparam(column) for column in COLUMNS}), changed)
+    rebuild_streaks(store, rescan)
+
+
+def habit_streaks(store, habits):
+    # {habit_id: HabitStreak} of habits, {habit_id: schedule row}; the
+    # habits that don't have a row yet get one, committed right away so
+    # they are only ever scanned once
+    streaks = {row.habit_id: row for row in HabitStreak.query.filter(
+        HabitStreak.habit_id.in_(habits))} if habits else {}
+    missing = {habit_id: habit for habit_id, habit in habits.items()
+               if habit_id not in streaks}
+    if missing:
+        from app.storage import insert_ignore  # it imports this module
+        values = summarize(habit_runs(store, missing), missing)
+        db.session.execute(insert_ignore(HabitStreak.__table__),
+                           list(values.values()))
+        db.session.commit()
+        for habit_id in missing:
+            streaks[habit_id] = HabitStreak(**values[habit_id])
+    return streaks
+
+
+def current_streaks(store, habits, streaks, today):
+    # {habit_id: due days in the run reaching the last due day or today},
+    # the latest run only starts after today when something was checked in
+    # ahead of time, those habits have their runs up to today looked up
+    current, ahead = {}, {}
+    for habit_id, streak in streaks.items():
+        if streak.last_start is not None and streak.last_start > today:
+            ahead[habit_id] = habits[habit_id]
+        else:
+            current[habit_id] = current_streak(streak, habits[habit_id],
+                                               today)
+    if ahead:
+        for habit_id, values in summarize(habit_runs(store, ahead, today),
+                                          ahead).items():
+            current[habit_id] = current_streak(HabitStreak(**values),
+                                               habits[habit_id], today)
+    return current
+
+
+def current_streak(streak, habit, today):
+    # due days in the latest run if it reaches the last day habit was due
+    # on before today, today isn't over before it is broken
+    if streak.last_end is None or \
+            streak.last_end < previous_due(habit, today):
+        return 0
+    return run_length(habit, streak.last_start, min(streak.last_end, today))
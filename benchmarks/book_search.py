@@ -0,0 +1,101 @@
+# Times the book log's search and keyset pages on a seeded database of
+# 100k books spread over a few users, the target is under 10 ms a search.
+#
+#   python benchmarks/book_search.py [--books 100000] [--users 10]
+#                                    [--database-url postgresql://...]
+#
+# Without --database-url a throwaway SQLite file is used. The database is
+# created from scratch, so never point it at a database you care about.
+import argparse
+import os
+import random
+import sys
+import tempfile
+import timeit
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from config import Config  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models import User, Book  # noqa: E402
+from app.main.books import (  # noqa: E402
+    page_of_books, parse_cursor, search_books)
+
+WORDS = ['river', 'night', 'garden', 'stone', 'winter', 'silver', 'house',
+         'ocean', 'letter', 'shadow', 'empire', 'glass', 'forest', 'storm',
+         'mirror', 'orchard', 'harbor', 'lantern', 'meadow', 'tower']
+NAMES = ['Austen', 'Borges', 'Calvino', 'Dickens', 'Eliot', 'Faulkner',
+         'Garcia', 'Hesse', 'Ishiguro', 'Joyce', 'Kafka', 'Le Guin']
+
+
+def seed(books, users):
+    rng = random.Random(0)
+    for u in range(users):
+        db.session.add(User(username='bench{}'.format(u),
+                            email='bench{}@example.com'.format(u)))
+    db.session.commit()
+    first = date(1990, 1, 1)
+    rows = [{'title': ' '.join(rng.sample(WORDS, 3)).title(),
+             'author': rng.choice(NAMES),
+             'date': first + timedelta(rng.randrange(0, 12000)),
+             'user_id': i % users + 1} for i in range(books)]
+    for i in range(0, len(rows), 10000):
+        db.session.execute(Book.__table__.insert(), rows[i:i + 10000])
+    db.session.commit()
+
+
+def timed(label, function, repeat):
+    seconds = min(timeit.repeat(function, number=1, repeat=repeat))
+    print('{:<28} {:8.2f} ms'.format(label, seconds * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--books', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    path = None
+    url = args.database_url
+    if url is None:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        url = 'sqlite:///' + path
+
+    class BenchConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = url
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(args.books, args.users)
+        if db.engine.name == 'sqlite':
+            db.session.execute('ANALYZE')
+        print('{} books, {} users'.format(Book.query.count(), args.users))
+
+        for q in ['river', 'riv', 'silver storm', 'kafka night', 'nothing']:
+            timed('search {!r}'.format(q),
+                  lambda: search_books(1, q, 50), args.repeat)
+            db.session.remove()
+        books, cursor = page_of_books(1, 50)
+        timed('first page', lambda: page_of_books(1, 50), args.repeat)
+        deep = None
+        while cursor:
+            deep = parse_cursor(cursor)
+            books, cursor = page_of_books(1, 50, deep)
+        if deep:
+            timed('last page', lambda: page_of_books(1, 50, deep),
+                  args.repeat)
+        db.session.remove()
+        db.drop_all()
+    if path:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+# Concurrent check-in throughput under each engine profile (app/engine.py):
+# forked worker processes, like gunicorn's, each log in as their own seeded
+# user and post the day's check-ins to /index as fast as they can.
+#
+#   python benchmarks/checkin_throughput.py [--workers 4] [--seconds 10]
+#                                           [--profiles none,sqlite]
+#                                           [--database-url postgresql://...]
+#
+# Without --database-url a throwaway SQLite file is used per profile, with
+# a Postgres url try --profiles none,postgres. The database is created from
+# scratch, so never point it at a database you care about.
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from config import Config  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models import User, Habit  # noqa: E402
+from seed import PASSWORD, seed  # noqa: E402
+
+
+def make_config(url, profile):
+    class BenchConfig(Config):
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = url
+        DATABASE_PROFILE = profile
+        REPORT_CACHE = 'none'
+    return BenchConfig
+
+
+def worker(config, username, seconds, start, results):
+    app = create_app(config)
+    client = app.test_client()
+    client.post('/auth/login', data={'username': username,
+                                     'password': PASSWORD})
+    with app.app_context():
+        habits = [id for id, in db.session.query(Habit.id).join(User).filter(
+            User.username == username)]
+        db.session.remove()
+    timings, errors = [], 0
+    start.wait()
+    deadline = time.time() + seconds
+    i = 0
+    while time.time() < deadline:
+        i += 1
+        t = time.perf_counter()
+        try:
+            response = client.post('/index', data={
+                'hform-habits': habits[i % 2::2], 'hform-submit': 'y'})
+            ok = response.status_code == 302
+        except Exception:
+            ok = False
+        if ok:
+            timings.append(time.perf_counter() - t)
+        else:
+            errors += 1
+    results.put((timings, errors))
+
+
+def run(url, profile, args):
+    config = make_config(url, profile)
+    app = create_app(config)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        usernames = seed(users=args.workers, habits=args.habits, years=1,
+                         books=0)
+        db.session.remove()
+        db.engine.dispose()  # no connections across the fork
+
+    ctx = multiprocessing.get_context('fork')
+    start = ctx.Event()
+    results = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(
+        config, name, args.seconds, start, results)) for name in usernames]
+    for process in processes:
+        process.start()
+    time.sleep(1)  # let them all log in
+    start.set()
+    timings, errors = [], 0
+    for process in processes:
+        t, e = results.get()
+        timings += t
+        errors += e
+    for process in processes:
+        process.join()
+    timings.sort()
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+    if not timings:
+        return len(timings), errors, 0, 0
+    return (len(timings), errors, timings[len(timings) // 2] * 1000,
+            timings[min(len(timings) - 1, len(timings) * 99 // 100)] * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--habits', type=int, default=5)
+    parser.add_argument('--profiles', default='none,sqlite')
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    print('{:<10} {:>9} {:>9} {:>7} {:>9} {:>9}'.format(
+        'profile', 'check-ins', 'per sec', 'errors', 'p50 ms', 'p99 ms'))
+    for profile in args.profiles.split(','):
+        path = None
+        url = args.database_url
+        if url is None:
+            fd, path = tempfile.mkstemp(suffix='.db')
+            os.close(fd)
+            url = 'sqlite:///' + path
+        done, errors, p50, p99 = run(url, profile, args)
+        print('{:<10} {:>9} {:>9.1f} {:>7} {:>9.2f} {:>9.2f}'.format(
+            profile, done, done / args.seconds, errors, p50, p99))
+        if path:
+            for name in glob.glob(path + '*'):  # with -wal and -shm
+                os.unlink(name)
+
+
+if __name__ == '__main__':
+    main()
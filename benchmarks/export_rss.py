@@ -0,0 +1,115 @@
+# Streams a large completion export through the /export route and samples
+# the process RSS while it is consumed, which should stay flat however many
+# rows the account has.
+#
+#   python benchmarks/export_rss.py [--habits 100] [--days 20000]
+#                                   [--format csv] [--database-url ...]
+#
+# Without --database-url a throwaway SQLite file is used. The database is
+# created from scratch, so never point it at a database you care about.
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from config import Config  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models import User, Habit, Completed  # noqa: E402
+from app.storage import rows_to_bitmaps  # noqa: E402
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except IOError:
+        pass
+    # peak rather than current outside of Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def seed(habits, days):
+    user = User(username='bench', email='bench@example.com')
+    user.set_password('bench')
+    db.session.add(user)
+    db.session.commit()
+    first = date(1950, 1, 1)
+    db.session.execute(Habit.__table__.insert(), [
+        {'id': h + 1, 'habit': 'habit {}'.format(h), 'start_date': first,
+         'end_date': date(9999, 1, 1), 'user_id': user.id}
+        for h in range(habits)])
+    for h in range(habits):
+        db.session.execute(Completed.__table__.insert(), [
+            {'habit_id': h + 1, 'date': first + timedelta(i)}
+            for i in range(days)])
+    db.session.commit()
+    if db.get_app().config['HABIT_STORAGE'] == 'bitmap':
+        rows_to_bitmaps()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--habits', type=int, default=100)
+    parser.add_argument('--days', type=int, default=20000)
+    parser.add_argument('--format', default='csv', choices=['csv', 'ndjson'])
+    parser.add_argument('--storage', default='rows',
+                        choices=['rows', 'bitmap'])
+    parser.add_argument('--samples', type=int, default=20)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    path = None
+    url = args.database_url
+    if url is None:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        url = 'sqlite:///' + path
+
+    class BenchConfig(Config):
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = url
+        HABIT_STORAGE = args.storage
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(args.habits, args.days)
+        db.session.remove()
+
+    rows = args.habits * args.days
+    every = max(rows // 1000 // args.samples, 1)  # chunks are ~1000 rows
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'bench',
+                                     'password': 'bench'})
+    print('{} completions, RSS before export {:.1f} MB'.format(rows,
+                                                                rss_mb()))
+    start = time.time()
+    response = client.get('/export/completed.' + args.format,
+                          buffered=False)
+    size = 0
+    for i, chunk in enumerate(response.response):
+        size += len(chunk)
+        if i % every == 0:
+            print('{:>10} bytes sent  RSS {:7.1f} MB'.format(size, rss_mb()))
+    response.close()
+    elapsed = time.time() - start
+    print('{} bytes in {:.1f} s ({:.0f} rows/s), RSS after {:.1f} MB'.format(
+        size, elapsed, rows / elapsed, rss_mb()))
+
+    with app.app_context():
+        db.drop_all()
+    if path:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# Pushes a burst of messages through app.email.send_email into a local
+# stand-in SMTP server and reports how long the worker pool takes to
+# deliver them and how many SMTP connections it opened.
+#
+#   pip install aiosmtpd
+#   python benchmarks/mail_dispatch.py [--messages 5000] [--workers 2]
+import argparse
+import os
+import sys
+import threading
+import time
+
+from aiosmtpd.controller import Controller
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from config import Config  # noqa: E402
+from app import create_app  # noqa: E402
+from app.email import send_email, mail_dispatcher  # noqa: E402
+
+
+class Counter(object):
+    # aiosmtpd handler counting the messages and sessions it receives
+
+    def __init__(self):
+        self.messages = 0
+        self.sessions = set()
+        self.lock = threading.Lock()
+
+    async def handle_DATA(self, server, session, envelope):
+        with self.lock:
+            self.messages += 1
+            self.sessions.add(id(session))
+        return '250 OK'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--queue-size', type=int, default=500)
+    parser.add_argument('--port', type=int, default=8025)
+    args = parser.parse_args()
+
+    handler = Counter()
+    controller = Controller(handler, hostname='127.0.0.1', port=args.port)
+    controller.start()
+
+    class BenchConfig(Config):
+        TESTING = True
+        MAIL_SUPPRESS_SEND = False
+        MAIL_SERVER = '127.0.0.1'
+        MAIL_PORT = args.port
+        MAIL_USE_TLS = False
+        MAIL_USERNAME = None
+        MAIL_PASSWORD = None
+        MAIL_WORKERS = args.workers
+        MAIL_QUEUE_SIZE = args.queue_size
+        MAIL_QUEUE_TIMEOUT = 60
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        start = time.time()
+        for i in range(args.messages):
+            send_email('[HabitTrack] message {}'.format(i),
+                       sender='bench@example.com',
+                       recipients=['user{}@example.com'.format(i)],
+                       text_body='text', html_body='<p>html</p>')
+        queued = time.time() - start
+        mail_dispatcher.shutdown(timeout=600)
+        elapsed = time.time() - start
+    controller.stop()
+
+    print('queued {} messages in {:.2f} s'.format(args.messages, queued))
+    print('delivered {} in {:.2f} s ({:.0f}/s) over {} SMTP sessions'.format(
+        handler.messages, elapsed, handler.messages / elapsed,
+        len(handler.sessions)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# Shows the query plans and timings of the hot queries before and after the
+# indexes declared in app/models.py, on a seeded database of about 1M
+# completions.
+#
+#   python benchmarks/query_plans.py [--users 200] [--habits 5] [--days 1000]
+#                                    [--database-url postgresql://...]
+#
+# Without --database-url a throwaway SQLite file is used. The database is
+# created from scratch, so never point it at a database you care about.
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from config import Config  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models import Habit, Completed, Life  # noqa: E402
+
+QUERIES = [
+    ('view grid',
+     'SELECT habit_id, date FROM completed WHERE habit_id IN (:h1, :h2) '
+     'AND date BETWEEN :d1 AND :d2'),
+    ('index check-ins',
+     'SELECT * FROM completed WHERE date = :d2 AND habit_id IN (:h1, :h2)'),
+    ('habits of user', 'SELECT * FROM habit WHERE user_id = :user'),
+    ('habits on day',
+     'SELECT * FROM habit WHERE user_id = :user AND start_date <= :d2 '
+     'AND end_date >= :d2'),
+    ('life of user',
+     'SELECT * FROM life WHERE user_id = :user ORDER BY year, week'),
+]
+
+
+def seed(users, habits, days, weeks):
+    first = date(2000, 1, 1)
+    db.session.execute(Habit.__table__.insert(), [
+        {'id': u * habits + h + 1, 'habit': 'habit {}'.format(h),
+         'start_date': first, 'end_date': date(9999, 1, 1), 'user_id': u + 1}
+        for u in range(users) for h in range(habits)])
+    db.session.execute(Life.__table__.insert(), [
+        {'year': 2000 + w // 52, 'week': w % 52 + 1, 'content': 'week',
+         'user_id': u + 1}
+        for u in range(users) for w in range(weeks)])
+    batch = []
+    for habit_id in range(1, users * habits + 1):
+        for i in range(days):
+            batch.append({'habit_id': habit_id,
+                          'date': first + timedelta(i)})
+        if len(batch) >= 50000:
+            db.session.execute(Completed.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Completed.__table__.insert(), batch)
+    db.session.commit()
+    return first
+
+
+def explain(sql, params):
+    if db.engine.name == 'sqlite':
+        rows = db.session.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in rows]
+    rows = db.session.execute('EXPLAIN ANALYZE ' + sql, params)
+    return [row[0] for row in rows]
+
+
+def report(label, params, repeat):
+    print('=== {} ==='.format(label))
+    for name, sql in QUERIES:
+        seconds = min(timeit.repeat(
+            lambda: db.session.execute(sql, params).fetchall(),
+            number=1, repeat=repeat))
+        print('{:<16} {:8.3f} ms'.format(name, seconds * 1000))
+        for line in explain(sql, params):
+            print('    ' + line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--habits', type=int, default=5)
+    parser.add_argument('--days', type=int, default=1000)
+    parser.add_argument('--weeks', type=int, default=520)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    path = None
+    url = args.database_url
+    if url is None:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        url = 'sqlite:///' + path
+
+    class BenchConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = url
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        indexes = [index for model in (Habit, Completed, Life)
+                   for index in model.__table__.indexes]
+        for index in indexes:
+            index.drop(db.engine)
+        first = seed(args.users, args.habits, args.days, args.weeks)
+        print('{} completions'.format(Completed.query.count()))
+
+        user = args.users // 2
+        params = {'user': user, 'h1': user * args.habits + 1,
+                  'h2': user * args.habits + 2,
+                  'd1': first + timedelta(args.days // 2),
+                  'd2': first + timedelta(args.days // 2 + 30)}
+        report('before', params, args.repeat)
+        for index in indexes:
+            index.create(db.engine)
+        if db.engine.name == 'sqlite':
+            db.session.execute('ANALYZE')
+        report('after', params, args.repeat)
+        db.session.remove()
+        db.drop_all()
+    if path:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+# Times every route of the main and auth blueprints through the test client
+# on seeded accounts of several sizes, counting the SQL statements of each
+# request, and writes the latency percentiles and query counts as JSON so
+# two runs can be compared.
+#
+#   python benchmarks/routes.py [--sizes small,medium,large] [--repeat 20]
+#                               [--output results.json] [--storage bitmap]
+#                               [--compare old.json] [--threshold 1.25]
+#                               [--database-url postgresql://...]
+#
+# With --compare, routes whose median got slower by more than --threshold
+# times, or which run more queries than before, are listed and the exit
+# status is 1. Without --database-url a throwaway SQLite file is used per
+# size. The database is created from scratch, so never point it at a
+# database you care about.
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from sqlalchemy import event  # noqa: E402
+from config import Config  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models import User, Habit  # noqa: E402
+from app.main.books import page_of_books  # noqa: E402
+from seed import SIZES, PASSWORD, seed  # noqa: E402
+
+TODAY = date.today()
+YEAR_AGO = (TODAY - timedelta(days=365)).strftime('%Y-%m-%d')
+
+
+def day(offset=0):
+    return (TODAY - timedelta(days=offset)).strftime('%Y-%m-%d')
+
+
+# (name, client, method, url, form data) in the order they are run, url and
+# data may be callables taking the iteration number so writes don't collide.
+# 'user' is logged in as the first seeded account, 'anon' is logged out.
+CASES = [
+    ('login GET', 'anon', 'GET', '/auth/login', None),
+    ('login POST', 'anon', 'POST', '/auth/login',
+     {'username': 'bench2', 'password': 'wrong'}),
+    ('register GET', 'anon', 'GET', '/auth/register', None),
+    ('register POST', 'anon', 'POST', '/auth/register',
+     lambda i: {'username': 'new{}'.format(i),
+                'email': 'new{}@example.com'.format(i),
+                'password': PASSWORD, 'password2': PASSWORD}),
+    ('reset_password_request GET', 'anon', 'GET',
+     '/auth/reset_password_request', None),
+    ('reset_password_request POST', 'anon', 'POST',
+     '/auth/reset_password_request', {'email': 'nobody@example.com'}),
+    ('reset_password GET', 'anon', 'GET', lambda i: reset_url(), None),
+    ('reset_password POST', 'anon', 'POST', lambda i: reset_url(),
+     {'password': PASSWORD, 'password2': PASSWORD}),
+    ('index GET', 'user', 'GET', '/index', None),
+    ('index POST', 'user', 'POST', '/index',
+     lambda i: {'hform-habits': [h for h in first_habits() if h % 2 != i % 2],
+                'hform-submit': 'y'}),
+    ('create GET', 'user', 'GET', '/create', None),
+    ('create POST', 'user', 'POST', '/create',
+     lambda i: {'habit': 'bench habit {}'.format(i), 'start_date': day(30),
+                'end_date': '9999-01-01'}),
+    ('select_habit GET', 'user', 'GET', '/select_habit', None),
+    ('select_habit POST', 'user', 'POST', '/select_habit',
+     lambda i: {'habit': first_habits()[0]}),
+    ('edit GET', 'user', 'GET', '/edit', None),
+    ('edit POST', 'user', 'POST', '/edit',
+     {'habit': 'habit 0', 'start_date': YEAR_AGO, 'end_date': '9999-01-01'}),
+    ('stats GET', 'user', 'GET', '/stats', None),
+    ('heatmap GET', 'user', 'GET', '/heatmap', None),
+    ('book GET', 'user', 'GET', '/book', None),
+    ('book POST', 'user', 'POST', '/book',
+     lambda i: {'title': 'Bench {}'.format(i), 'author': 'Bench',
+                'date': day()}),
+    ('book page 2 GET', 'user', 'GET', lambda i: next_book_page(), None),
+    ('book search GET', 'user', 'GET', '/book/search?q=book 1', None),
+    ('view GET week', 'user', 'GET', '/view', None),
+    ('view POST', 'user', 'POST', '/view', {'start': YEAR_AGO, 'end': day()}),
+    ('view GET year', 'user', 'GET', '/view', None),
+    ('life GET', 'user', 'GET', '/life', None),
+    ('life POST', 'user', 'POST', '/life',
+     lambda i: {'year': TODAY.year, 'week': i % 52 + 1,
+                'content': 'bench {}'.format(i)}),
+    ('export GET', 'user', 'GET', '/export', None),
+    ('export completed.csv', 'user', 'GET', '/export/completed.csv', None),
+    ('import GET', 'user', 'GET', '/import', None),
+    ('import POST', 'user', 'POST', '/import',
+     lambda i: {'format': 'csv', 'file': (io.BytesIO(
+         'habit,date\nhabit 0,{}\n'.format(day(i)).encode()), 'i.csv')}),
+    ('logout', 'user', 'GET', '/auth/logout', None),
+]
+
+
+def first_habits():
+    return [id for id, in db.session.query(Habit.id).join(User).filter(
+        User.username == 'bench1').order_by(Habit.id).limit(5)]
+
+
+def next_book_page():
+    # the url of the second page of the first account's book log
+    user = User.query.filter_by(username='bench1').first()
+    books, cursor = page_of_books(user.id, Config.BOOKS_PER_PAGE)
+    return '/book?before={}'.format(cursor or '')
+
+
+def reset_url():
+    # a fresh token for the second account, it is reset to PASSWORD
+    user = User.query.filter_by(username='bench2').first()
+    return '/auth/reset_password/' + user.get_reset_password_token()
+
+
+class QueryCounter(object):
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self.before)
+
+    def before(self, conn, cursor, statement, parameters, context,
+               executemany):
+        self.count += 1
+
+
+def percentile(values, p):
+    # nearest rank
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def login(client, username):
+    response = client.post('/auth/login', data={
+        'username': username, 'password': PASSWORD})
+    assert response.status_code == 302, 'login failed'
+
+
+def run_case(app, clients, counter, case, repeat):
+    name, client, method, url, data = case
+    client = clients[client]
+    timings = []
+    queries = []
+    statuses = set()
+    for i in range(repeat):
+        if name == 'logout' and i:
+            login(client, 'bench1')
+        with app.app_context():
+            u = url(i) if callable(url) else url
+            d = data(i) if callable(data) else data
+        counter.count = 0
+        start = time.perf_counter()
+        response = client.open(u, method=method, data=d)
+        response.get_data()  # drain streamed responses
+        timings.append((time.perf_counter() - start) * 1000)
+        queries.append(counter.count)
+        statuses.add(response.status_code)
+        response.close()
+    return {
+        'status': sorted(statuses),
+        'queries': max(queries),
+        'mean_ms': sum(timings) / len(timings),
+        'p50_ms': percentile(timings, 50),
+        'p90_ms': percentile(timings, 90),
+        'p99_ms': percentile(timings, 99),
+        'max_ms': max(timings),
+    }
+
+
+def bench_size(name, params, args):
+    path = None
+    url = args.database_url
+    if url is None:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        url = 'sqlite:///' + path
+
+    class BenchConfig(Config):
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = url
+        HABIT_STORAGE = args.storage
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        start = time.time()
+        seed(**params)
+        seeded = time.time() - start
+        counter = QueryCounter(db.engine)
+    clients = {'user': app.test_client(), 'anon': app.test_client()}
+    login(clients['user'], 'bench1')
+    routes = {}
+    for case in CASES:
+        routes[case[0]] = result = run_case(app, clients, counter, case,
+                                            args.repeat)
+        print('{:<10} {:<28} {:>9.2f} {:>9.2f} {:>9.2f} {:>5}'.format(
+            name, case[0], result['p50_ms'], result['p90_ms'],
+            result['p99_ms'], result['queries']))
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    if path:
+        os.unlink(path)
+    return {'params': params, 'seed_seconds': seeded, 'routes': routes}
+
+
+def compare(old, new, threshold):
+    # (size, route, what, before, after) for every regression
+    regressions = []
+    if old.get('storage') != new['storage']:
+        return regressions
+    for size, result in new['sizes'].items():
+        before = old['sizes'].get(size)
+        if before is None or before['params'] != result['params']:
+            continue
+        for route, r in result['routes'].items():
+            b = before['routes'].get(route)
+            if b is None:
+                continue
+            if r['p50_ms'] > b['p50_ms'] * threshold:
+                regressions.append((size, route, 'p50_ms', b['p50_ms'],
+                                    r['p50_ms']))
+            if r['queries'] > b['queries']:
+                regressions.append((size, route, 'queries', b['queries'],
+                                    r['queries']))
+    return regressions
+
+
+def revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='small,medium,large')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--storage', default='rows',
+                        choices=['rows', 'bitmap'])
+    parser.add_argument('--output')
+    parser.add_argument('--compare')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    results = {'created': datetime.utcnow().isoformat(),
+               'revision': revision(), 'storage': args.storage,
+               'repeat': args.repeat, 'sizes': {}}
+    print('{:<10} {:<28} {:>9} {:>9} {:>9} {:>5}'.format(
+        'size', 'route', 'p50 ms', 'p90 ms', 'p99 ms', 'sql'))
+    for name in args.sizes.split(','):
+        results['sizes'][name] = bench_size(name, SIZES[name], args)
+
+    output = args.output or 'routes-{}.json'.format(
+        datetime.utcnow().strftime('%Y%m%d-%H%M%S'))
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print('wrote ' + output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        regressions = compare(old, results, args.threshold)
+        for size, route, what, before, after in regressions:
+            print('REGRESSION {} {} {}: {:.2f} -> {:.2f}'.format(
+                size, route, what, before, after))
+        if regressions:
+            sys.exit(1)
+        print('no regressions against ' + args.compare)
+
+
+if __name__ == '__main__':
+    main()
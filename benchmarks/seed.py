@@ -0,0 +1,65 @@
+# Synthetic, reproducible accounts for the benchmarks: users with habits
+# and years of completions, books and life weeks. seed() writes straight
+# into the tables inside an app context, then builds the rollups and, with
+# HABIT_STORAGE set to 'bitmap', the bitmaps, so the app sees the same
+# state a real history would leave behind. Same arguments, same data.
+import random
+from datetime import date, timedelta
+
+from app import db
+from app.models import User, Habit, Completed, Book, Life
+from app.rollups import rebuild_totals
+from app.storage import rows_to_bitmaps
+
+PASSWORD = 'bench'
+SIZES = {
+    'small': {'users': 2, 'habits': 5, 'years': 1, 'books': 20},
+    'medium': {'users': 5, 'habits': 15, 'years': 5, 'books': 200},
+    'large': {'users': 10, 'habits': 40, 'years': 20, 'books': 2000},
+}
+
+
+def seed(users, habits, years, books, completion_rate=0.7, today=None,
+         seed=0):
+    # returns the usernames, all with PASSWORD
+    rng = random.Random(seed)
+    today = today or date.today()
+    first = today - timedelta(days=365 * years)
+    template = User(username='template')
+    template.set_password(PASSWORD)  # hashing is slow, do it once
+    names = ['bench{}'.format(u) for u in range(1, users + 1)]
+    for name in names:
+        # ids come from the database so the sequences stay usable
+        u = db.session.execute(User.__table__.insert(), {
+            'username': name, 'email': name + '@example.com',
+            'password_hash': template.password_hash}).inserted_primary_key[0]
+        rows = []
+        for h in range(habits):
+            start = first + timedelta(days=rng.randrange(0, 60))
+            habit_id = db.session.execute(Habit.__table__.insert(), {
+                'habit': 'habit {}'.format(h), 'start_date': start,
+                'end_date': date(9999, 1, 1),
+                'user_id': u}).inserted_primary_key[0]
+            for i in range((today - start).days + 1):
+                if rng.random() < completion_rate:
+                    rows.append({'habit_id': habit_id,
+                                 'date': start + timedelta(days=i)})
+            if len(rows) >= 50000:
+                db.session.execute(Completed.__table__.insert(), rows)
+                rows = []
+        if rows:
+            db.session.execute(Completed.__table__.insert(), rows)
+        db.session.execute(Book.__table__.insert(), [
+            {'title': 'Book {}'.format(b), 'author': 'Author {}'.format(b),
+             'date': first + timedelta(days=rng.randrange(0, 365 * years)),
+             'user_id': u}
+            for b in range(books)])
+        db.session.execute(Life.__table__.insert(), [
+            {'year': first.year + w // 52, 'week': w % 52 + 1,
+             'content': 'week {}'.format(w), 'user_id': u}
+            for w in range(52 * years) if rng.random() < 0.5])
+    rebuild_totals()
+    db.session.commit()
+    if db.get_app().config['HABIT_STORAGE'] == 'bitmap':
+        rows_to_bitmaps()
+    return names
@@ -0,0 +1,103 @@
+# Measures the cold start: the import time of each extension, create_app()
+# and the first response, every number taken in a fresh interpreter.
+#
+#   python benchmarks/startup.py [--repeat 5]
+#
+# The first response is timed with the template bytecode cache empty and
+# filled, with and without the pre-warm at boot.
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+MODULES = ['flask', 'flask_sqlalchemy', 'flask_migrate', 'flask_login',
+           'flask_mail', 'flask_bootstrap', 'flask_wtf', 'jwt', 'app']
+
+IMPORT = '''
+import sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+'''
+
+FIRST_RESPONSE = '''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+from config import Config
+from app import create_app, db
+from app.models import User
+
+class BenchConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    JINJA_BYTECODE_CACHE_DIR = {cache!r}
+    TEMPLATE_PREWARM = {prewarm!r}
+
+app = create_app(BenchConfig)
+booted = time.perf_counter()
+with app.app_context():
+    db.create_all()
+    user = User(username='bench', email='bench@example.com')
+    user.set_password('bench')
+    db.session.add(user)
+    db.session.commit()
+client = app.test_client()
+client.post('/auth/login', data={{'username': 'bench', 'password': 'bench'}})
+first = time.perf_counter()
+for url in ['/index', '/stats', '/view', '/life', '/book']:
+    assert client.get(url).status_code == 200
+print(json.dumps({{'boot': booted - start,
+                  'first_pages': time.perf_counter() - first}}))
+'''
+
+
+def run(code):
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT)
+    return output.decode().strip().splitlines()[-1]
+
+
+def best(values):
+    return min(values) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print('import (ms, includes the dependencies not yet imported)')
+    for module in MODULES:
+        seconds = [float(run(IMPORT.format(root=ROOT, module=module)))
+                   for i in range(args.repeat)]
+        print('  {:<20} {:8.1f}'.format(module, best(seconds)))
+
+    cache = tempfile.mkdtemp()
+    print('boot and first pages (ms)')
+    for label, directory, prewarm, clear in [
+            ('no bytecode cache', '', False, False),
+            ('cold bytecode cache', cache, False, True),
+            ('warm bytecode cache', cache, False, False),
+            ('warm cache, prewarm', cache, True, False)]:
+        boot, pages = [], []
+        for i in range(args.repeat):
+            if clear:
+                shutil.rmtree(cache)
+                os.mkdir(cache)
+            result = json.loads(run(FIRST_RESPONSE.format(
+                root=ROOT, cache=directory, prewarm=prewarm)))
+            boot.append(result['boot'])
+            pages.append(result['first_pages'])
+        print('  {:<20} boot {:8.1f}  first pages {:8.1f}'.format(
+            label, best(boot), best(pages)))
+    shutil.rmtree(cache)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -10,9 +11,76 @@ class Config(object):
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # engine settings, 'auto' picks them by the database url, 'sqlite' and
+    # 'postgres' force one, 'none' keeps the defaults, see app/engine.py
+    DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE') or 'auto'
+    SQLITE_PRAGMAS = [
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('busy_timeout', 5000),  # ms
+        ('mmap_size', 256 * 1024 * 1024),
+        ('cache_size', -64 * 1024),  # KiB
+    ]
+    # the gunicorn workers share DATABASE_MAX_CONNECTIONS, half of each
+    # worker's share is kept open, the rest is overflow
+    DATABASE_MAX_CONNECTIONS = int(os.environ.get('DATABASE_MAX_CONNECTIONS')
+                                   or 20)
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY') or 1)
+    DATABASE_POOL_RECYCLE = 300  # seconds
+    DATABASE_STATEMENT_TIMEOUT = int(
+        os.environ.get('DATABASE_STATEMENT_TIMEOUT') or 30000)  # ms
+    # 'rows' or 'bitmap', see app/storage.py, convert the data with
+    # `flask storage convert` before switching
+    HABIT_STORAGE = os.environ.get('HABIT_STORAGE') or 'rows'
+    # computed reports are cached per user, 'lru' keeps them in each worker,
+    # 'filesystem' shares them between the workers of a dyno, 'none' is off
+    REPORT_CACHE = os.environ.get('REPORT_CACHE') or 'lru'
+    REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_BYTES') or
+                                 32 * 1024 * 1024)
+    REPORT_CACHE_DIR = os.environ.get('REPORT_CACHE_DIR') or \
+        os.path.join(tempfile.gettempdir(), 'habittrack-reports')
+    REPORT_CACHE_TIMEOUT = int(os.environ.get('REPORT_CACHE_TIMEOUT') or
+                               24 * 60 * 60)
+    # seconds a logged in user is served from memory, 0 loads it every time
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 30)
+    USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE') or 1000)
+    # 'cookie' keeps the session in the signed cookie, 'database' keeps it
+    # in the stored_session table and only its id in the cookie, a share of
+    # the writes also sweeps the expired ones, see app/sessions.py
+    SESSION_STORE = os.environ.get('SESSION_STORE') or 'cookie'
+    SESSION_SWEEP_PROBABILITY = float(
+        os.environ.get('SESSION_SWEEP_PROBABILITY') or 0.01)
+    # compiled templates are kept on disk between restarts and all of them
+    # are compiled at boot, '' turns the cache off
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR',
+                                              os.path.join(
+                                                  tempfile.gettempdir(),
+                                                  'habittrack-jinja'))
+    TEMPLATE_PREWARM = os.environ.get('TEMPLATE_PREWARM', '1') != '0'
+    BOOKS_PER_PAGE = 50
+    # /view and /life are sent while they are rendered
+    STREAM_TEMPLATES = os.environ.get('STREAM_TEMPLATES', '1') != '0'
+    # logs the time create_app() spends on each extension
+    STARTUP_PROFILE = os.environ.get('STARTUP_PROFILE') is not None
+    # per request SQL statement counts, see app/sqlstats.py, the warnings
+    # about repeated statements go to logs/habittrack.log
+    SQL_STATS = os.environ.get('SQL_STATS', '1') != '0'
+    SQL_STATS_LOG = os.environ.get('SQL_STATS_LOG') is not None
+    SQL_STATS_REPEAT_LIMIT = int(os.environ.get('SQL_STATS_REPEAT_LIMIT') or
+                                 10)
+    SERVER_TIMING = os.environ.get('SERVER_TIMING') is not None
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 25)
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS') is not None
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     ADMINS = ['bberastain@gmail.com']
+    # outgoing mail is queued and sent by a pool of worker threads, see
+    # app/email.py
+    MAIL_WORKERS = int(os.environ.get('MAIL_WORKERS') or 2)
+    MAIL_QUEUE_SIZE = int(os.environ.get('MAIL_QUEUE_SIZE') or 500)
+    MAIL_QUEUE_TIMEOUT = 5  # seconds a sender waits on a full queue
+    MAIL_IDLE_TIMEOUT = 2  # seconds a connection is kept open while idle
+    MAIL_RETRIES = 3
+    MAIL_RETRY_BACKOFF = 1  # seconds, doubled on each retry
+    MAIL_DRAIN_TIMEOUT = 10  # seconds given to queued mail on shutdown
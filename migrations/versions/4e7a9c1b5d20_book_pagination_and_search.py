@@ -0,0 +1,59 @@
+"""book pagination and search
+
+Revision ID: 4e7a9c1b5d20
+Revises: 8b1f0c7d2e4a
+Create Date: 2026-10-18 13:21:47.502611
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '4e7a9c1b5d20'
+down_revision = '8b1f0c7d2e4a'
+branch_labels = None
+depends_on = None
+
+# the same statements as BOOK_SEARCH_DDL in app/models.py
+SQLITE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5("
+    "title, author, content='book', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS book_fts_insert AFTER INSERT ON book "
+    "BEGIN INSERT INTO book_fts (rowid, title, author) "
+    "VALUES (new.id, new.title, new.author); END",
+    "CREATE TRIGGER IF NOT EXISTS book_fts_delete AFTER DELETE ON book "
+    "BEGIN INSERT INTO book_fts (book_fts, rowid, title, author) "
+    "VALUES ('delete', old.id, old.title, old.author); END",
+    "CREATE TRIGGER IF NOT EXISTS book_fts_update AFTER UPDATE ON book "
+    "BEGIN INSERT INTO book_fts (book_fts, rowid, title, author) "
+    "VALUES ('delete', old.id, old.title, old.author); "
+    "INSERT INTO book_fts (rowid, title, author) "
+    "VALUES (new.id, new.title, new.author); END",
+    # index the books already there
+    "INSERT INTO book_fts (book_fts) VALUES ('rebuild')",
+]
+POSTGRESQL = [
+    "CREATE INDEX ix_book_search ON book USING gin "
+    "(to_tsvector('simple', coalesce(title, '') || ' ' || "
+    "coalesce(author, '')))",
+]
+
+
+def upgrade():
+    op.create_index('ix_book_user_id_date_id', 'book',
+                    ['user_id', 'date', 'id'], unique=False)
+    dialect = op.get_bind().dialect.name
+    for statement in {'sqlite': SQLITE, 'postgresql': POSTGRESQL}.get(
+            dialect, []):
+        op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for trigger in ['insert', 'delete', 'update']:
+            op.execute('DROP TRIGGER IF EXISTS book_fts_' + trigger)
+        op.execute('DROP TABLE IF EXISTS book_fts')
+    elif dialect == 'postgresql':
+        op.drop_index('ix_book_search', table_name='book')
+    op.drop_index('ix_book_user_id_date_id', table_name='book')
@@ -0,0 +1,127 @@
+import codecs
+from datetime import date, timedelta
+import io
+import unittest
+from app import create_app, db
+from app.importer import import_completions
+from app.models import User, Habit, HabitStreak
+from app.main.reports import stats_rows
+from app.schedules import WEEKDAYS, weekday_mask
+from app.storage import stores
+from app.streaks import habit_schedules, habit_streaks, current_streaks
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    REPORT_CACHE = 'none'
+
+
+class AppCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.user = User(username='susan', email='susan@example.com')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+
+class StreakCase(AppCase):
+
+    def setUp(self):
+        super(StreakCase, self).setUp()
+        self.today = date.today()
+        self.habit = Habit(habit='run', user_id=self.user.id,
+                           start_date=self.today - timedelta(30))
+        db.session.add(self.habit)
+        db.session.commit()
+
+    def check_in(self, store, days):
+        for day in days:
+            store.apply(day, [self.habit.id], [])
+            db.session.commit()
+
+    def streaks(self):
+        # (current, longest) of the only habit
+        row = stats_rows(self.user.id, self.today)[0]
+        return row[4], row[5]
+
+    def check_future_completion(self, storage):
+        self.app.config['HABIT_STORAGE'] = storage
+        store = stores[storage]
+        self.check_in(store, [self.today - timedelta(i)
+                              for i in range(4, -1, -1)])
+        self.assertEqual(self.streaks(), (5, 5))
+        # a check-in ahead of time doesn't break the current streak
+        self.check_in(store, [self.today + timedelta(3)])
+        self.assertEqual(self.streaks(), (5, 5))
+
+    def test_future_completion_rows(self):
+        self.check_future_completion('rows')
+
+    def test_future_completion_bitmap(self):
+        self.check_future_completion('bitmap')
+
+    def test_missing_rows_are_saved(self):
+        store = stores[self.app.config['HABIT_STORAGE']]
+        store.bulk_add([(self.habit.id, self.today - timedelta(i))
+                        for i in range(3)])
+        db.session.commit()
+        self.assertEqual(self.streaks(), (3, 3))
+        self.assertEqual(HabitStreak.query.get(self.habit.id).longest, 3)
+
+    def check_due_days(self, storage):
+        # Monday, Wednesday and Friday from Monday 2018-01-01 on
+        store = stores[storage]
+        self.habit.schedule = WEEKDAYS
+        self.habit.schedule_value = weekday_mask([0, 2, 4])
+        self.habit.start_date = date(2018, 1, 1)
+        db.session.commit()
+        self.check_in(store, [date(2018, 1, day) for day in (1, 3, 4, 5, 8)])
+        streak = HabitStreak.query.get(self.habit.id)
+        self.assertEqual((streak.longest, streak.longest_start,
+                          streak.longest_end),
+                         (4, date(2018, 1, 1), date(2018, 1, 8)))
+
+        habits = habit_schedules(Habit.id == self.habit.id)
+        streaks = habit_streaks(store, habits)
+        for today, current in [(date(2018, 1, 9), 4), (date(2018, 1, 10), 4),
+                               (date(2018, 1, 11), 0)]:
+            self.assertEqual(current_streaks(store, habits, streaks,
+                                             today)[self.habit.id], current)
+
+        # taking back the Wednesday splits the run
+        store.apply(date(2018, 1, 3), [], [self.habit.id])
+        db.session.commit()
+        streak = HabitStreak.query.get(self.habit.id)
+        self.assertEqual((streak.last_start, streak.longest),
+                         (date(2018, 1, 5), 2))
+
+    def test_due_days_rows(self):
+        self.check_due_days('rows')
+
+    def test_due_days_bitmap(self):
+        self.check_due_days('bitmap')
+
+
+class ImportCase(AppCase):
+
+    def test_csv_with_byte_order_mark(self):
+        lines = io.BytesIO(codecs.BOM_UTF8 + b'habit,date\nrun,2018-07-26\n')
+        result = import_completions(self.user.id, lines, 'csv')
+        self.assertEqual((result['rows'], result['skipped']), (1, 0))
+        habit = Habit.query.filter_by(user_id=self.user.id).one()
+        self.assertEqual(habit.habit, 'run')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)